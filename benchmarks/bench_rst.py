@@ -0,0 +1,79 @@
+"""Measure the time needed to convert reStructuredText documents to
+HTML, with a new docutils publisher for each document (as Soho used
+to do) and with the publisher that Soho reuses for all documents.
+
+Usage (with Soho installed in the current environment, for example
+with ``pip install -e .``)::
+
+    $ python benchmarks/bench_rst.py [-n 20] [path ...]
+
+If no path is given, all reStructuredText files of the test fixtures
+and of the documentation are converted.
+"""
+
+import argparse
+import glob
+import os
+import time
+
+from docutils.core import publish_parts
+
+from soho.generators.rst import DOCUTILS_SETTINGS
+from soho.generators.rst import RSTPublisher
+from soho.generators.rst import Writer
+from soho.utils import read_front_matter
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATTERNS = ('../tests/fixtures/*.rst',
+                    '../docs/*.rst',
+                    '../docs/_tutorial/*/src/*.rst')
+
+
+def read_sources(paths):
+    sources = []
+    for path in paths:
+        with open(path) as fp:
+            sources.append(read_front_matter(fp.read())[1])
+    return sources
+
+
+# Warnings and errors of documents that use Sphinx-only directives
+# would flood the output.
+SETTINGS_OVERRIDES = dict(DOCUTILS_SETTINGS, report_level=5)
+
+
+def publish_with_new_publisher(source):
+    return publish_parts(source,
+                         writer=Writer(),
+                         settings_overrides=SETTINGS_OVERRIDES)
+
+
+def bench(func, sources, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        for source in sources:
+            func(source)
+    return (time.time() - start) / (repeat * len(sources))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--repeat', type=int, default=20)
+    parser.add_argument('paths', nargs='*')
+    args = parser.parse_args()
+    paths = args.paths
+    if not paths:
+        for pattern in DEFAULT_PATTERNS:
+            paths.extend(sorted(glob.glob(os.path.join(HERE, pattern))))
+    sources = read_sources(paths)
+    publisher = RSTPublisher(SETTINGS_OVERRIDES)
+    print('%d document(s), %d run(s)' % (len(sources), args.repeat))
+    for label, func in (('new publisher', publish_with_new_publisher),
+                        ('reused publisher', publisher.publish_parts)):
+        per_doc = bench(func, sources, args.repeat)
+        print('%-18s %8.3f ms/document' % (label, per_doc * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Measure the startup time of Soho: the time needed to import
+``soho.cli`` and the time of a run with the ``--assets-only`` option on
+a site whose assets have not changed.
+
+Usage (with Soho installed in the current environment, for example
+with ``pip install -e .``)::
+
+    $ python benchmarks/bench_startup.py [-n 20]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SITE_DIR = os.path.join(HERE, '..', 'docs', '_tutorial', '2-assets')
+IMPORT_CODE = 'import soho.cli'
+RUN_CODE = ('import sys; from soho.cli import main; '
+            'sys.argv = ["soho-build", "--assets-only"]; main()')
+
+
+def bench(code, cwd, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.time()
+        subprocess.check_call([sys.executable, '-c', code], cwd=cwd,
+                              stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+        timings.append(time.time() - start)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--repeat', type=int, default=20)
+    args = parser.parse_args()
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        site_dir = os.path.join(tmp_dir, 'site')
+        shutil.copytree(SITE_DIR, site_dir)
+        # The first run copies assets, next runs have nothing to do.
+        subprocess.check_call([sys.executable, '-c', RUN_CODE],
+                              cwd=site_dir, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+        print('Median of %d run(s)' % args.repeat)
+        for label, code in (('python', 'pass'),
+                            ('import soho.cli', IMPORT_CODE),
+                            ('soho --assets-only', RUN_CODE)):
+            median = bench(code, site_dir, args.repeat)
+            print('%-20s %8.1f ms' % (label, median * 1000))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Measure the cold start of template rendering: the time needed by a
+fresh process to load, compile and render the templates of the
+tutorial sites, without cache directory, with an empty cache directory
+and with a cache directory filled by a previous run.
+
+Usage (with Soho installed in the current environment, for example
+with ``pip install -e .``)::
+
+    $ python benchmarks/bench_templates.py [-n 20]
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TEMPLATES = sorted(glob.glob(os.path.join(
+    HERE, '..', 'docs', '_tutorial', '*', 'templates', '*.pt')))
+RENDER_CODE = '''
+import sys
+from soho.renderers.zpt import ZPTRenderer
+def translate(msgid, **kwargs):
+    return msgid
+for path in sys.argv[2:]:
+    renderer = ZPTRenderer(path, translate)
+    renderer.setup(cache_dir=sys.argv[1] or None)
+    renderer.render(md={'title': 'Title'}, body='')
+'''
+
+
+def run(cache_dir):
+    start = time.time()
+    subprocess.check_call([sys.executable, '-c', RENDER_CODE,
+                           cache_dir or ''] + TEMPLATES)
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--repeat', type=int, default=20)
+    args = parser.parse_args()
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        cold, empty, warm = [], [], []
+        for i in range(args.repeat):
+            cache_dir = os.path.join(tmp_dir, str(i))
+            cold.append(run(None))
+            empty.append(run(cache_dir))
+            warm.append(run(cache_dir))
+        print('Median of %d run(s), %d template(s)' % (
+            args.repeat, len(TEMPLATES)))
+        for label, timings in (('no cache', cold),
+                               ('empty cache', empty),
+                               ('filled cache', warm)):
+            timings.sort()
+            median = timings[len(timings) // 2]
+            print('%-20s %8.1f ms' % (label, median * 1000))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
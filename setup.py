@@ -14,6 +14,9 @@ extras_require = {'i18n': ('translationstring', ),
                   'zpt': ('chameleon', )}
 all_extras = tuple(itertools.chain(*extras_require.values()))
 extras_require['all'] = all_extras
+# Linux only: the watch mode is notified of changes by the kernel
+# instead of looking for them periodically.
+extras_require['watch'] = ('inotify_simple', )
 # Sphinx is not required but can be installed to benefit from several
 # extra ReST directives it defines.
 tests_require = ('mock', 'sphinx') + all_extras
@@ -29,9 +32,9 @@ setup(name='Soho',
         'Intended Audience :: Developers',
         'License :: OSI Approved :: BSD License',
         'Programming Language :: Python',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.2',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.7',
         'Topic :: Internet :: WWW/HTTP',
         'Topic :: Text Processing :: Markup :: HTML',
         ),
@@ -42,6 +45,7 @@ setup(name='Soho',
       packages=find_packages(),
       include_package_data=True,
       zip_safe=False,
+      python_requires='>=3.7',
       install_requires=requires,
       extras_require=extras_require,
       tests_require=tests_require,
@@ -1,25 +1,34 @@
-from copy import deepcopy
+import logging
 import os
 import shutil
+import traceback
 
 from soho.config import ENCODING
 from soho.config import METADATA_FILE_SUFFIX
+from soho import generators
 from soho.generators import get_generator
 from soho.i18n import interpolate
 from soho.i18n import TranslatorWrapper
+from soho.manifest import Manifest
 from soho.renderers import get_renderer
+from soho.utils import CodeCache
+from soho.utils import combine_regexps
 from soho.utils import hide_index_html_from
+from soho.utils import Metadata
 from soho.utils import read_dir_metadata
 from soho.utils import Sitemap
+from soho.utils import SitemapStore
+from soho.utils import sync_file
 
 
 class Builder(object):
     """Driver class."""
 
-    def __init__(self, asset_dir, assets_only, base_url, do_nothing,
-                 force, hide_index_html, locale_dir, ignore_files,
-                 logger, out_dir, src_dir, sitemap, template,
-                 template_dir):
+    def __init__(self, asset_dir, asset_jobs, asset_sync, assets_only,
+                 base_url, cache_dir, change_detection, do_nothing, force,
+                 hide_index_html, locale_dir, locales, ignore_files,
+                 jobs, logger, manifest, out_dir, prune, src_dir, sitemap,
+                 sitemap_gzip, template, template_dir):
         """Initialize the builder.
 
         Arguments must be passed by name only. Their order may change
@@ -29,6 +38,18 @@ class Builder(object):
             The directory where assets (images, stylesheets, etc.)
             live. Must be set to ``None`` if no such directory exists.
 
+        ``asset_jobs``
+            The number of assets that are copied at the same time (in
+            threads). This is useful if the output directory is on a
+            network file system, for example.
+
+        ``asset_sync``
+            How assets are copied to the output directory: ``'copy'``
+            (a regular copy), ``'hardlink'`` (a hard link to the
+            asset) or ``'reflink'`` (a copy-on-write clone, on file
+            systems that support it). Assets are copied if they cannot
+            be linked.
+
         ``assets_only``
             If set, process only assets, not source files. This may be
             useful if the only changes are on the CSS, for example.
@@ -38,6 +59,25 @@ class Builder(object):
             generate the URLs in the Sitemap. If you want the Sitemap
             to have valid URLs, this variable must be set.
 
+        ``cache_dir``
+            The directory where Soho keeps data between runs to speed
+            up the next builds (for example, compiled metadata files
+            and HTML converted from reStructuredText).
+            This directory will be created if it does not exist. Must
+            be set to ``None`` if you do not want such data to be
+            kept.
+
+        ``change_detection``
+            How to detect that a file must be generated (or copied)
+            again. If set to ``'mtime'``, the modification time of the
+            source file is compared to the one of the generated file.
+            If set to ``'hash'``, the content of the source file is
+            compared to the content it had when the file was last
+            generated, which is recorded in the manifest (see
+            ``manifest`` below). The latter is useful when
+            modification times are not reliable, for example after a
+            fresh clone of a repository.
+
         ``do_nothing``
             If set, no directories nor files are created. This can be
             useful to test a new configuration. Note that you can
@@ -61,39 +101,93 @@ class Builder(object):
         ``ignore_files``
             A (possibly empty) sequence of regular expressions. If the
             path of a file matches one of these expressions, it will
-            not be processed.
+            not be processed. If the path of a directory, with or
+            without a trailing separator, matches one of them, the
+            directory is not walked.
+
+        ``jobs``
+            The number of processes that generate HTML files. If
+            greater than 1, source files are processed in parallel by
+            a pool of worker processes. Each worker has its own
+            templates and translations.
 
         ``locale_dir``
             The directory where translations are stored. Must be set
             to ``None`` if no such directory exists.
 
+        ``locales``
+            A sequence of locales. If set, each source file is
+            processed once per locale, in a subdirectory of
+            ``out_dir`` that is named after the locale. Source files
+            are converted to HTML only once, and the template is
+            rendered once per locale. Must be set to ``None`` if
+            there is only one version of the site.
+
         ``logger``
             The logger to be used.
 
+        ``manifest``
+            The name of the build manifest, a file that is stored in
+            the output directory and records the dependencies of each
+            generated file (source file, metadata files, template and
+            translation catalogs). A file is generated again if any of
+            its dependencies has changed. Must be set to ``None`` if
+            you do not want such a file to be used, in which case only
+            the modification time of the source file is checked.
+
         ``out_dir``
             The directory where the web site will be generated. This
             directory will be created if it does not exist.
 
+        ``prune``
+            If set, a full build removes generated files (and copied
+            assets) whose source file has been removed (or is now
+            ignored) since the previous build, as recorded in the
+            manifest, and directories that become empty. Requires a
+            manifest.
+
         ``src_dir``
             The directory where source files live.
 
         ``sitemap``
             The name of the Sitemap file. Must be set to ``None`` if
-            you do not want such a file to be generated.
+            you do not want such a file to be generated. If the site
+            has more than 50,000 URLs, they are split into several
+            files (``sitemap-1.xml``, ``sitemap-2.xml``, etc.) and the
+            file with the given name is a Sitemap index that refers to
+            them.
+
+        ``sitemap_gzip``
+            If set, Sitemap files are compressed with gzip and a
+            ``.gz`` suffix is appended to their name.
 
         ``template``
-            The filename of the template to use. It must not be a
-            relative or absolute path to the file (like
-            ``/path/to/templates/layout.pt``) but only a filename
-            (``layout.pt``).
+            The filename of the default template, which may be
+            overridden by the ``template`` key of the metadata of
+            each source file. It must not be a relative or absolute
+            path to the file (like ``/path/to/templates/layout.pt``)
+            but only a filename (``layout.pt``).
 
         ``template_dir``
             The directory where templates live.
         """
+        # Worker processes build their own builder from these settings.
+        self._settings = dict(locals())
+        del self._settings['self']
         self.logger = logger
+        # Generators and renderers get the cache directory when they
+        # are set up, and store their data in subdirectories of it.
+        self._cache_dir = cache_dir or None
+        if cache_dir:
+            self._code_cache = CodeCache(os.path.join(cache_dir, 'metadata'))
+        else:
+            self._code_cache = CodeCache()
         self._src_dir = src_dir
         self._asset_dir = asset_dir
         self._template_dir = template_dir
+        self._locale_dir = locale_dir
+        self._locales = locales
+        self.translators = None
         if locale_dir:
             self.load_translations(locale_dir)
         self._template = template
@@ -102,18 +196,68 @@ class Builder(object):
         self._force = force
         self._assets_only = assets_only
         self._ignore_files = ignore_files
+        self._ignore_regexp = combine_regexps(ignore_files)
         self._hide_index_html = hide_index_html
+        self._jobs = jobs
+        self._change_detection = change_detection
+        self._asset_sync = asset_sync
+        self._asset_jobs = asset_jobs
+        self._prune = prune
+        if manifest:
+            self.manifest = Manifest(os.path.join(out_dir, manifest))
+        else:
+            self.manifest = None
+        self.sitemap_store = None
         if sitemap:
             self._base_url = base_url
             self._sitemap_path = os.path.join(out_dir, sitemap)
+            self._sitemap_gzip = sitemap_gzip
             self.sitemap = Sitemap()
+            if self.manifest is not None:
+                self.sitemap_store = SitemapStore(self.manifest.sitemap)
         else:
             self.sitemap = None
+        self._renderers = {}
+        self._generators = {}
+        self.reset()
+
+    def reset(self):
+        """Forget everything that has been gathered and cached
+        during the previous build (except compiled templates, which
+        are reloaded only if they are modified).
+        """
         self._changed = False
+        self._renderer_hits = 0
+        self._renderer_misses = 0
+        self._translation_hits = 0
+        self._translation_misses = 0
+        if self._locale_dir:
+            self.translators.pop_stats()
+        self._bytes_copied = 0
+        self._bytes_linked = 0
+        self._outputs = set()
+        self._dir_metadata = {}
+        self._metadata_files = {}
+        self._catalogs = {}
+        if self.sitemap:
+            self.sitemap.reset()
+        if self.manifest is not None:
+            self.manifest.forget_digests()
 
     def load_translations(self, locale_dir):
+        if self.translators is not None:
+            self.translators.close()
         self.translators = TranslatorWrapper(locale_dir)
 
+    def collect_translation_stats(self):
+        """Add the statistics of the translation memo since the last
+        call to the statistics of the current build.
+        """
+        if self._locale_dir:
+            hits, misses = self.translators.pop_stats()
+            self._translation_hits += hits
+            self._translation_misses += misses
+
     def translate(self, msgid, domain=None, mapping=None,
                   default=None, context=None):
         """Translate the given ``msgid``.
@@ -128,113 +272,815 @@ class Builder(object):
         return self.translators.translate(locale, msgid, domain, mapping)
 
     def build(self):
+        self.reset()
         if self._do_nothing:
             self.logger.info('Dry run. No files will be harmed, I promise.')
         if self._asset_dir:
             self.logger.info('Copying assets...')
-            self.process_dir(self._asset_dir,
-                             self._asset_dir,
-                             callback=self.copy_asset,
-                             read_metadata=False)
+            if self._asset_jobs > 1:
+                # Output directories are created while walking the
+                # assets directory, before any asset is copied.
+                asset_tasks = []
+                def add_asset_task(in_path, relative_path, _dir_metadata,
+                                   in_stat):
+                    asset_tasks.append((in_path, relative_path, in_stat))
+                self.process_dir(self._asset_dir,
+                                 self._asset_dir,
+                                 callback=add_asset_task,
+                                 read_metadata=False)
+                self.copy_assets_in_parallel(asset_tasks)
+            else:
+                self.process_dir(self._asset_dir,
+                                 self._asset_dir,
+                                 callback=self.copy_asset,
+                                 read_metadata=False)
         if not self._assets_only:
             self.logger.info('Building HTML files...')
-            self.process_dir(self._src_dir,
-                             self._src_dir,
-                             callback=self.process_src_file,
-                             read_metadata=True,
-                             inherited_metadata={})
-        if self.sitemap and (self._changed or self._force):
-            self.logger.info('Generating Sitemap...')
             if not self._do_nothing:
-                with open(self._sitemap_path, 'w+') as out:
-                    self.sitemap.write(out)
+                for out_dir_path in self.get_output_dirs(self._src_dir, ''):
+                    try:
+                        os.mkdir(out_dir_path)
+                    except FileExistsError:
+                        pass
+            if self._jobs > 1:
+                tasks = []
+                def add_task(in_path, relative_path, _dir_metadata, in_stat):
+                    tasks.append((in_path, relative_path, in_stat))
+                self.process_dir(self._src_dir,
+                                 self._src_dir,
+                                 callback=add_task,
+                                 read_metadata=False)
+                self.process_src_files_in_parallel(tasks)
+            else:
+                # Generators are torn down even if a file cannot be
+                # processed, so that a long-lived builder (see
+                # ``rebuild()``) does not keep them in a bad state.
+                try:
+                    self.process_dir(self._src_dir,
+                                     self._src_dir,
+                                     callback=self.process_src_file,
+                                     read_metadata=True,
+                                     inherited_metadata=Metadata())
+                finally:
+                    self.teardown_generators()
+        if self._prune and self.manifest is not None:
+            self.prune()
+        if self.sitemap:
+            self.update_sitemap(remove_missing=not self._assets_only)
+        if self.manifest is not None and not self._do_nothing:
+            self.manifest.save()
+        self.logger.info('Template cache: %d hit(s), %d miss(es).',
+                         self._renderer_hits, self._renderer_misses)
+        if self._locale_dir:
+            self.collect_translation_stats()
+            self.logger.info('Translation memo: %d hit(s), %d miss(es).',
+                             self._translation_hits,
+                             self._translation_misses)
+        if self._asset_dir:
+            self.logger.info('Assets: %d byte(s) copied, %d byte(s) linked.',
+                             self._bytes_copied, self._bytes_linked)
         self.logger.info('Done.')
         if self._do_nothing:
             self.logger.info('Dry run. No files have been harmed.')
 
     def process_dir(self, base_dir, dir_path, callback, read_metadata,
                     inherited_metadata=None):
+        """Call ``callback`` for each file of the given directory and
+        its subdirectories (except ignored files), with the path of
+        the file, its path relative to ``base_dir``, the metadata of
+        its directory (if ``read_metadata`` is set) and the result of
+        ``os.stat()`` on the file.
+
+        Directories are read with ``os.scandir()``, so that the type
+        of each entry is usually known without any system call, and
+        each file is stat'ed only once.
+        """
+        with os.scandir(dir_path) as it:
+            entries = list(it)
         if read_metadata:
-            dir_metadata = deepcopy(inherited_metadata)
-            dir_metadata.update(read_dir_metadata(dir_path))
+            # Do not look for a metadata file that does not exist.
+            if any(entry.name == METADATA_FILE_SUFFIX for entry in entries):
+                metadata = read_dir_metadata(dir_path, self._code_cache)
+            else:
+                metadata = {}
+            dir_metadata = inherited_metadata.child(metadata)
         else:
             dir_metadata = None
-        for filename in os.listdir(dir_path):
-            path = os.path.join(dir_path, filename)
+        for entry in entries:
+            path = entry.path
             relative_path = path[len(base_dir) + 1:]
-            if self.ignore_file(relative_path):
+            is_dir = entry.is_dir()
+            if self.ignore_file(relative_path, is_dir):
                 self.logger.debug('Ignoring "%s".', path)
                 continue
-            if os.path.isdir(path):
+            if is_dir:
                 if not self._do_nothing:
-                    out_dir_path = os.path.join(self._out_dir, relative_path)
-                    if not os.path.exists(out_dir_path):
-                        os.mkdir(out_dir_path)
+                    for out_dir_path in self.get_output_dirs(base_dir,
+                                                             relative_path):
+                        try:
+                            os.mkdir(out_dir_path)
+                        except FileExistsError:
+                            pass
                 self.process_dir(base_dir, path, callback, read_metadata,
                                  dir_metadata)
             else:
-                callback(path, relative_path, dir_metadata)
+                callback(path, relative_path, dir_metadata, entry.stat())
+
+    def rebuild(self, paths, update_sitemap=True):
+        """Process only the source files and assets that are
+        affected by a change of the given ``paths``.
+
+        Modified source files and assets are processed again, as well
+        as files that depend on modified metadata files, templates and
+        translation catalogs (as recorded in the manifest). This is
+        used to keep the site up to date while files are being edited
+        (see :class:`soho.watch.Watcher`). If ``update_sitemap`` is
+        set and there is a manifest, the Sitemap is updated but URLs of
+        removed files are removed only by the next call to
+        ``build()``. Without a manifest, the URLs of the files that are
+        not processed again are not known, so the Sitemap is left
+        untouched.
+        """
+        self.reset()
+        in_paths = set()
+        assets = set()
+        for path in paths:
+            if self._is_in_dir(path, self._locale_dir):
+                self.load_translations(self._locale_dir)
+            if self._is_in_dir(path, self._asset_dir):
+                assets.add(path)
+            elif self._is_in_dir(path, self._src_dir) and \
+                    not path.endswith(METADATA_FILE_SUFFIX):
+                in_paths.add(path)
+            elif self.manifest is not None:
+                in_paths.update(self.manifest.get_dependents(path))
+            else:
+                self.logger.info('"%s" has changed, building everything.',
+                                 path)
+                self.build()
+                return
+        for in_path in sorted(assets):
+            relative_path = in_path[len(self._asset_dir) + 1:]
+            if self._should_rebuild(in_path, relative_path):
+                self.copy_asset(in_path, relative_path)
+        if self._assets_only:
+            return
+        try:
+            for in_path in sorted(in_paths):
+                relative_path = in_path[len(self._src_dir) + 1:]
+                if self._should_rebuild(in_path, relative_path):
+                    dir_metadata = self.get_dir_metadata(
+                        os.path.dirname(in_path))
+                    self.process_src_file(in_path, relative_path,
+                                          dir_metadata)
+        finally:
+            self.teardown_generators()
+        if self.sitemap_store is not None and update_sitemap:
+            self.update_sitemap(remove_missing=False)
+        if self.manifest is not None and not self._do_nothing:
+            self.manifest.save()
+
+    def _should_rebuild(self, in_path, relative_path):
+        if not os.path.isfile(in_path) or self.ignore_path(relative_path):
+            return False
+        if self._is_in_dir(in_path, self._src_dir):
+            base_dir = self._src_dir
+        else:
+            base_dir = self._asset_dir
+        for out_dir_path in self.get_output_dirs(
+                base_dir, os.path.dirname(relative_path)):
+            if not self._do_nothing and not os.path.exists(out_dir_path):
+                os.makedirs(out_dir_path)
+        return True
+
+    def _is_in_dir(self, path, dir_path):
+        return bool(dir_path) and path.startswith(dir_path + os.sep)
+
+    def update_sitemap(self, remove_missing):
+        """Write the Sitemap.
+
+        If there is a manifest, the Sitemap is stored in it and only
+        Sitemap files that contain added, modified or (if
+        ``remove_missing`` is set) removed URLs are written. Otherwise,
+        the Sitemap is generated from scratch if any file has been
+        generated.
+        """
+        if self.sitemap_store is None:
+            if self._changed or self._force:
+                self.logger.info('Generating Sitemap...')
+                if not self._do_nothing:
+                    self.sitemap.save(self._sitemap_path, self._base_url,
+                                      compress=self._sitemap_gzip)
+            return
+        store = self.sitemap_store
+        visited = set()
+        for url, last_mod, change_freq, priority in self.sitemap.entries():
+            store.set(url, last_mod, change_freq, priority)
+            visited.add(url)
+        if remove_missing:
+            for url in store.urls() - visited:
+                store.remove(url)
+        if self._do_nothing:
+            return
+        written = store.save(self._sitemap_path, self._base_url,
+                             compress=self._sitemap_gzip, force=self._force)
+        if written:
+            self.logger.info('Updated Sitemap (%d file(s) written).',
+                             len(written))
+            self.manifest.touch()
+
+    def prune(self):
+        """Remove generated files (and copied assets) that have been
+        recorded in the manifest by a previous build but not by the
+        current one, because their source file has been removed (or is
+        now ignored). Directories that become empty are also removed.
+
+        With the ``assets_only`` option, only copied assets are
+        removed.
+        """
+        dirs = set()
+        for key in sorted(self.manifest.outputs):
+            if key in self._outputs:
+                continue
+            source = self.manifest.outputs[key]['source']
+            if self._assets_only and \
+                    not self._is_in_dir(source, self._asset_dir):
+                continue
+            out_path = os.path.join(self._out_dir, *key.split('/'))
+            self.logger.info('Removing "%s".', out_path)
+            if not self._do_nothing:
+                try:
+                    os.unlink(out_path)
+                except OSError:  # already removed
+                    pass
+            self.manifest.forget(key)
+            dirs.add(os.path.dirname(out_path))
+        if self._do_nothing:
+            return
+        # Deepest directories first, so that their parents may become
+        # empty too.
+        for dir_path in sorted(dirs, reverse=True):
+            while self._is_in_dir(dir_path, self._out_dir):
+                try:
+                    os.rmdir(dir_path)
+                except OSError:  # not empty (or already removed)
+                    break
+                self.logger.info('Removed empty directory "%s".', dir_path)
+                dir_path = os.path.dirname(dir_path)
+
+    def process_src_files_in_parallel(self, tasks):
+        """Process source files in a pool of worker processes.
+
+        ``tasks`` is a sequence of ``(in_path, relative_path, in_stat)``
+        tuples. Results are merged back in the order of ``tasks``, so
+        that the outcome does not depend on the order in which
+        workers finish.
+        """
+        # Imported here because it is slow to import and not needed
+        # for serial builds.
+        from concurrent.futures import ProcessPoolExecutor
+        chunksize = max(1, len(tasks) // (self._jobs * 4))
+        with ProcessPoolExecutor(max_workers=self._jobs,
+                                 initializer=_init_worker,
+                                 initargs=(self._settings, )) as executor:
+            for results in executor.map(_process_in_worker, tasks,
+                                        chunksize=chunksize):
+                self.merge_results(results)
+
+    def pop_results(self):
+        """Return and reset what has been gathered by
+        ``process_src_file`` since the last call.
+        """
+        self.collect_translation_stats()
+        results = {'changed': self._changed,
+                   'renderer_hits': self._renderer_hits,
+                   'renderer_misses': self._renderer_misses,
+                   'translation_hits': self._translation_hits,
+                   'translation_misses': self._translation_misses,
+                   'log': [],
+                   'manifest': None,
+                   'outputs': list(self._outputs),
+                   'sitemap': []}
+        if isinstance(self.logger, WorkerLogger):
+            results['log'] = self.logger.pop_records()
+        if self.manifest is not None:
+            results['manifest'] = self.manifest.pop_updates()
+        self._changed = False
+        self._renderer_hits = self._renderer_misses = 0
+        self._translation_hits = self._translation_misses = 0
+        self._outputs = set()
+        if self.sitemap:
+            results['sitemap'] = self.sitemap.pop_entries()
+        return results
+
+    def merge_results(self, results):
+        """Merge results gathered by ``pop_results()`` in another
+        builder (usually in a worker process).
+
+        Messages that have been logged by the other builder are logged
+        here, so that messages of all tasks are logged in the order of
+        tasks, by the logger of the main process.
+        """
+        for level, msg, args in results['log']:
+            self.logger.log(level, msg, *args)
+        self._changed = self._changed or results['changed']
+        self._renderer_hits += results['renderer_hits']
+        self._renderer_misses += results['renderer_misses']
+        self._translation_hits += results['translation_hits']
+        self._translation_misses += results['translation_misses']
+        self._outputs.update(results['outputs'])
+        if results['manifest'] is not None:
+            self.manifest.update(results['manifest'])
+        if self.sitemap:
+            self.sitemap.extend(results['sitemap'])
+
+    def get_dir_metadata(self, dir_path):
+        """Return the metadata of the given source directory,
+        including metadata inherited from its parent directories.
+        """
+        try:
+            return self._dir_metadata[dir_path]
+        except KeyError:
+            pass
+        if dir_path == self._src_dir:
+            parent = Metadata()
+        else:
+            parent = self.get_dir_metadata(os.path.dirname(dir_path))
+        metadata = parent.child(read_dir_metadata(dir_path, self._code_cache))
+        self._dir_metadata[dir_path] = metadata
+        return metadata
+
+    def copy_assets_in_parallel(self, tasks):
+        """Copy assets in a pool of threads.
+
+        ``tasks`` is a sequence of ``(in_path, relative_path, in_stat)``
+        tuples. Copies are logged and recorded in the order of
+        ``tasks``, whatever the order in which they are done.
+        """
+        # Imported here because it is not needed for serial builds.
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=self._asset_jobs) as executor:
+            for result in executor.map(lambda task: self.sync_asset(*task),
+                                       tasks):
+                self.record_asset(*result)
+
+    def copy_asset(self, in_path, relative_path, _dir_metadata=None,
+                   in_stat=None):
+        self.record_asset(*self.sync_asset(in_path, relative_path, in_stat))
+
+    def sync_asset(self, in_path, relative_path, in_stat=None):
+        """Copy (or link) the asset at ``in_path`` to the output
+        directory if it is outdated.
 
-    def copy_asset(self, in_path, relative_path, *_ignored_args):
+        Return a tuple that consists of the path of the asset, the
+        path of its copy, the size of the asset (or ``None`` if it has
+        not been copied) and whether its data is shared with the copy
+        (see ``asset_sync``). Nothing is logged nor recorded, so that
+        this method can be called from several threads (see
+        ``record_asset()``). With the ``'hash'`` change detection, the
+        digest of the asset may be computed and stored in the manifest,
+        which is thread-safe (see :class:`soho.manifest.Manifest`).
+
+        ``in_stat`` is the result of ``os.stat(in_path)``, if it is
+        already known.
+        """
         out_path = os.path.join(self._out_dir, relative_path)
-        if not self.should_overwrite(out_path, in_path):
+        if in_stat is None:
+            in_stat = os.stat(in_path)
+        if not self.is_asset_outdated(out_path, in_path, in_stat):
+            return in_path, out_path, None, False
+        shared = False
+        if not self._do_nothing:
+            shared = sync_file(in_path, out_path, self._asset_sync)
+        return in_path, out_path, in_stat.st_size, shared
+
+    def record_asset(self, in_path, out_path, size, shared):
+        """Log and record the copy of an asset, as returned by
+        ``sync_asset()``.
+        """
+        self._outputs.add(self._get_output_key(out_path))
+        if size is None:
             self.logger.debug('Not overwriting "%s", it seems up to date.',
                               out_path)
             return
         self.logger.info('Copying "%s" to "%s"' % (in_path, out_path))
         if not self._do_nothing:
-            shutil.copy2(in_path, out_path)
+            if shared:
+                self._bytes_linked += size
+            else:
+                self._bytes_copied += size
+        self.record_output(out_path, in_path, [])
 
-    def process_src_file(self, in_path, relative_path, dir_metadata):
-        out_path = os.path.join(self._out_dir, relative_path)
+    def is_asset_outdated(self, out_path, in_path, in_stat):
+        """Return whether the asset at ``in_path`` must be copied
+        again to ``out_path``.
+
+        Copies (and links) have the size and the modification time of
+        the asset. If they match, the asset is not read, even if
+        ``change_detection`` is ``'hash'``.
+        """
+        if self._force:
+            return True
+        try:
+            out_stat = os.stat(out_path)
+        except OSError:
+            return True
+        if out_stat.st_size == in_stat.st_size and \
+                out_stat.st_mtime == in_stat.st_mtime:
+            return False
+        if self._change_detection == 'hash':
+            key = self._get_output_key(out_path)
+            return self.manifest.is_outdated(key, [in_path])
+        return True
+
+    def get_output_dirs(self, base_dir, relative_path):
+        """Return the output directories of the directory at
+        ``relative_path`` in ``base_dir`` (the source or the assets
+        directory). There is one for each locale of the ``locales``
+        setting, if it is set, for source directories.
+        """
+        if self._locales and base_dir == self._src_dir:
+            return [os.path.join(self._out_dir, locale, relative_path)
+                    for locale in self._locales]
+        return [os.path.join(self._out_dir, relative_path)]
+
+    def get_output_path(self, relative_path, generated, locale=None):
+        """Return the path of the file that is generated from the
+        source file at ``relative_path`` and its URL (relative to the
+        root of the site). ``generated`` tells whether the file is
+        generated (or copied as is). If ``locale`` is given, the file
+        is generated in the subdirectory of this locale.
+        """
+        if locale:
+            out_path = os.path.join(self._out_dir, locale, relative_path)
+        else:
+            out_path = os.path.join(self._out_dir, relative_path)
         relative_url = relative_path.replace(os.sep, '/')
-        generator = get_generator(in_path)
-        if generator is not None:
+        if generated:
             out_path = '%s.html' % os.path.splitext(out_path)[0]
             relative_url = '%s.html' % os.path.splitext(relative_url)[0]
         if self._hide_index_html:
             relative_url = hide_index_html_from(relative_url)
         if not relative_url or relative_url[0] != '/':
             relative_url = '/%s' % relative_url
-        if self.sitemap:
-            url = self._base_url + relative_url
-            self.sitemap.add(in_path, url, 'monthly', 0.5)
-        if not self.should_overwrite(out_path, in_path):
-            self.logger.debug('Not overwriting "%s", it seems up to date.',
-                              out_path)
+        if locale:
+            relative_url = '/%s%s' % (locale, relative_url)
+        return out_path, relative_url
+
+    def find_sources(self, url_path):
+        """Return a list that contains the source file (or the
+        asset) from which the file at the given URL path is generated
+        (or copied), or an empty list if there is none.
+
+        This is the reverse of ``get_output_path()``.
+        """
+        parts = [part for part in url_path.split('/')
+                 if part not in ('', '.', '..')]
+        base_dirs = (self._src_dir, self._asset_dir)
+        if self._locales and parts and parts[0] in self._locales:
+            parts = parts[1:]
+            base_dirs = (self._src_dir, )
+        relative_path = os.path.join(*parts) if parts else ''
+        if not relative_path or url_path.endswith('/') or \
+                os.path.isdir(os.path.join(self._src_dir, relative_path)):
+            relative_path = os.path.join(relative_path, 'index.html')
+        candidates = [relative_path]
+        base, ext = os.path.splitext(relative_path)
+        if ext == '.html':
+            candidates.extend('%s.%s' % (base, generator_ext)
+                              for generator_ext in sorted(generators.registry))
+        for candidate in candidates:
+            if self.ignore_path(candidate):
+                continue
+            for base_dir in base_dirs:
+                if not base_dir:
+                    continue
+                path = os.path.join(base_dir, candidate)
+                if os.path.isfile(path):
+                    return [path]
+        return []
+
+    def get_generator(self, path):
+        """Return the generator for the given file, or ``None`` if
+        there is none.
+
+        Generators are created (and set up) only once per file
+        extension and per build.
+        """
+        ext = os.path.splitext(path)[1]
+        try:
+            return self._generators[ext]
+        except KeyError:
+            pass
+        generator = get_generator(path)
+        if generator is not None:
+            generator.setup(cache_dir=self._cache_dir)
+        self._generators[ext] = generator
+        return generator
+
+    def teardown_generators(self):
+        """Tear down generators that have been used since the last
+        call. They are created again if needed.
+        """
+        for generator in self._generators.values():
+            if generator is not None:
+                generator.teardown()
+        self._generators = {}
+
+    def teardown_renderers(self):
+        """Tear down and forget all renderers."""
+        for _, renderer in self._renderers.values():
+            renderer.teardown()
+        self._renderers = {}
+
+    def process_src_file(self, in_path, relative_path, dir_metadata,
+                         in_stat=None):
+        """Generate (or copy) the output file(s) of the given source
+        file, if they are outdated.
+
+        If the ``locales`` setting is set, there is one output file
+        per locale. The source file is then converted only once and
+        the template is rendered for each outdated output file.
+        """
+        generator = self.get_generator(in_path)
+        if in_stat is None:
+            in_stat = os.stat(in_path)
+        if generator is None:
+            deps = []
+        else:
+            # The template (which may be chosen by metadata) and the
+            # templates it depends on are known only once the file has
+            # been generated. The manifest tells whether they have
+            # changed since the previous build.
+            deps = self.get_metadata_files(in_path)
+        outdated = []
+        for locale in self._locales or (None, ):
+            out_path, relative_url = self.get_output_path(
+                relative_path, generator is not None, locale)
+            self._outputs.add(self._get_output_key(out_path))
+            if self.sitemap:
+                url = self._base_url + relative_url
+                self.sitemap.add(in_path, url, 'monthly', 0.5,
+                                 mtime=in_stat.st_mtime)
+            out_deps = deps
+            if locale and generator is not None:
+                out_deps = deps + self.get_catalogs(locale)
+            if not self.is_outdated(out_path, in_path, out_deps, in_stat):
+                self.logger.debug('Not overwriting "%s", it seems up to '
+                                  'date.', out_path)
+                continue
+            outdated.append((locale, out_path, relative_url, out_deps))
+        if not outdated:
             return
         self._changed = True
         if generator is None:
-            self.logger.info('Could not find any generator for "%s", '
-                             'copying it as is.', in_path)
-            if not self._do_nothing:
-                shutil.copy2(in_path, out_path)
+            for _, out_path, _, out_deps in outdated:
+                self.logger.info('Could not find any generator for "%s", '
+                                 'copying it as is.', in_path)
+                if not self._do_nothing:
+                    shutil.copy2(in_path, out_path)
+                self.record_output(out_path, in_path, out_deps)
             return 1
-        self.logger.info('Processing "%s" (writing in "%s").',
-                         in_path, out_path)
-        metadata = deepcopy(dir_metadata)
         file_metadata, body = generator.generate(in_path)
-        metadata.update(file_metadata)
-        metadata.update(path=relative_url)
-        template_path = os.path.join(self._template_dir, self._template)
+        file_metadata = dir_metadata.child(file_metadata)
+        template_path = os.path.join(
+            self._template_dir, file_metadata.get('template', self._template))
+        renderer = self.get_renderer(template_path)
+        template_deps = [template_path] + renderer.get_dependencies()
+        for locale, out_path, relative_url, out_deps in outdated:
+            self.logger.info('Processing "%s" (writing in "%s").',
+                             in_path, out_path)
+            if locale:
+                metadata = file_metadata.child({'locale': locale})
+            else:
+                metadata = file_metadata
+            metadata['path'] = relative_url
+            bindings = {'body': body,
+                        'md': metadata,
+                        'assets': '/assets'}
+            html_output = renderer.render(**bindings)
+            if not self._do_nothing:
+                with open(out_path, 'wb+') as out:
+                    out.write(html_output.encode(ENCODING))
+            out_deps = out_deps + template_deps
+            if not locale:
+                out_deps += self.get_catalogs(metadata.get('locale'))
+            self.record_output(out_path, in_path, out_deps)
+
+    def get_metadata_files(self, in_path):
+        """Return the paths of all metadata files (existing or not)
+        that the given source file inherits metadata from, including
+        its own metadata file.
+        """
+        dir_path = os.path.dirname(in_path)
+        try:
+            dir_files = self._metadata_files[dir_path]
+        except KeyError:
+            if dir_path == self._src_dir:
+                dir_files = []
+            else:
+                dir_files = list(self.get_metadata_files(dir_path)[:-1])
+            dir_files.append(os.path.join(dir_path, METADATA_FILE_SUFFIX))
+            self._metadata_files[dir_path] = dir_files
+        return dir_files + ['%s%s' % (in_path, METADATA_FILE_SUFFIX)]
+
+    def get_catalogs(self, locale):
+        """Return the paths of the translation catalogs of the given
+        ``locale``.
+        """
+        if not locale or not self._locale_dir:
+            return []
+        try:
+            return self._catalogs[locale]
+        except KeyError:
+            pass
+        msg_dir_path = os.path.join(self._locale_dir, locale, 'LC_MESSAGES')
+        try:
+            filenames = os.listdir(msg_dir_path)
+        except OSError:
+            filenames = []
+        catalogs = [os.path.join(msg_dir_path, filename)
+                    for filename in sorted(filenames)
+                    if filename.endswith('.mo')]
+        self._catalogs[locale] = catalogs
+        return catalogs
+
+    def is_outdated(self, out_path, in_path, deps, in_stat=None):
+        """Return whether ``out_path`` must be generated again from
+        ``in_path``, either because the latter has changed or because
+        one of its other dependencies has changed.
+
+        ``in_stat`` is the result of ``os.stat(in_path)``, if it is
+        already known.
+        """
+        key = self._get_output_key(out_path)
+        if self._change_detection == 'hash':
+            if self._force or not os.path.exists(out_path):
+                return True
+            return self.manifest.is_outdated(key, [in_path] + deps)
+        if self.should_overwrite(out_path, in_path, in_stat):
+            return True
+        if self.manifest is None or not deps:
+            return False
+        return self.manifest.is_outdated(key, deps)
+
+    def record_output(self, out_path, in_path, deps):
+        """Record the dependencies of a generated file in the
+        manifest (if any).
+        """
+        if self._change_detection == 'hash':
+            deps = [in_path] + deps
+        if self.manifest is not None:
+            self.manifest.record(self._get_output_key(out_path),
+                                 in_path, deps)
+
+    def _get_output_key(self, out_path):
+        return out_path[len(self._out_dir) + 1:].replace(os.sep, '/')
+
+    def get_renderer(self, template_path):
+        """Return the renderer for the given template.
+
+        Renderers are cached for the whole build (one per template),
+        so that each template is loaded and compiled only once. A
+        renderer is discarded (and torn down) if its template, or any
+        file that the template depends on (such as templates whose
+        macros it uses), has been modified since it has been loaded.
+        """
+        mtime = os.stat(template_path).st_mtime
+        try:
+            signature, renderer = self._renderers[template_path]
+        except KeyError:
+            pass
+        else:
+            if signature == self._get_renderer_signature(
+                    mtime, renderer.get_dependencies()):
+                self._renderer_hits += 1
+                return renderer
+            renderer.teardown()
+        self._renderer_misses += 1
         renderer = get_renderer(template_path, self.translate)
-        bindings = {'body': body,
-                    'md': metadata,
-                    'assets': '/assets'}
-        html_output = renderer.render(**bindings)
-        if not self._do_nothing:
-            with open(out_path, 'wb+') as out:
-                out.write(html_output.encode(ENCODING))
+        renderer.setup(cache_dir=self._cache_dir)
+        signature = self._get_renderer_signature(
+            mtime, renderer.get_dependencies())
+        self._renderers[template_path] = (signature, renderer)
+        return renderer
+
+    def _get_renderer_signature(self, mtime, dependencies):
+        signature = [mtime]
+        for path in dependencies:
+            try:
+                signature.append(os.stat(path).st_mtime)
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
 
-    def ignore_file(self, relative_path):
+    def ignore_file(self, relative_path, is_dir=False):
+        """Return whether the file (or the directory, if ``is_dir`` is
+        set) at the given path, relative to the source (or assets)
+        directory, must be ignored.
+
+        All expressions of the ``ignore_files`` setting are combined
+        into a single one. The path of a directory is also tested with
+        a trailing separator, so that ``'drafts/'`` or ``'.*/tmp/'``
+        ignore whole directories.
+        """
         if relative_path.endswith(METADATA_FILE_SUFFIX):
             return True
-        for regexp in self._ignore_files:
-            if regexp.match(relative_path):
+        match = self._ignore_regexp.match
+        if match(relative_path) is not None:
+            return True
+        return is_dir and match(relative_path + os.sep) is not None
+
+    def ignore_path(self, relative_path):
+        """Return whether the file at the given path, relative to the
+        source (or assets) directory, is ignored or is in an ignored
+        directory. This is needed when a file is processed without
+        walking its directory (see ``rebuild()``).
+        """
+        if self.ignore_file(relative_path):
+            return True
+        dir_path = os.path.dirname(relative_path)
+        while dir_path:
+            if self.ignore_file(dir_path, is_dir=True):
                 return True
+            dir_path = os.path.dirname(dir_path)
         return False
 
-    def should_overwrite(self, out_path, in_path):
-        return self._force or \
-            not os.path.exists(out_path) or \
-            os.stat(in_path).st_mtime > os.stat(out_path).st_mtime
+    def should_overwrite(self, out_path, in_path, in_stat=None):
+        if self._force:
+            return True
+        try:
+            out_stat = os.stat(out_path)
+        except OSError:
+            return True
+        if in_stat is None:
+            in_stat = os.stat(in_path)
+        return in_stat.st_mtime > out_stat.st_mtime
+
+
+class WorkerLogger(object):
+    """The logger of the builder of worker processes. Messages are
+    not emitted but kept as records, which are returned with the
+    results of each task (see ``Builder.pop_results()``) and logged by
+    the main process (see ``Builder.merge_results()``).
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def log(self, level, msg, *args):
+        self.records.append((level, msg, args))
+
+    def debug(self, msg, *args):
+        self.log(logging.DEBUG, msg, *args)
+
+    def info(self, msg, *args):
+        self.log(logging.INFO, msg, *args)
+
+    def warning(self, msg, *args):
+        self.log(logging.WARNING, msg, *args)
+
+    def error(self, msg, *args):
+        self.log(logging.ERROR, msg, *args)
+
+    def pop_records(self):
+        """Return and reset the records of logged messages."""
+        records = self.records
+        self.records = []
+        return records
+
+
+# The builder of the current worker process, see
+# 'Builder.process_src_files_in_parallel()'.
+_worker_builder = None
+
+
+def _teardown_worker():
+    _worker_builder.teardown_generators()
+    _worker_builder.teardown_renderers()
+
+
+def _init_worker(settings):
+    from multiprocessing.util import Finalize
+    global _worker_builder
+    settings = dict(settings, logger=WorkerLogger())
+    _worker_builder = Builder(**settings)
+    # Plugins of the worker are torn down when the worker exits.
+    Finalize(None, _teardown_worker, exitpriority=10)
+
+
+def _process_in_worker(task):
+    in_path, relative_path, in_stat = task
+    try:
+        dir_metadata = _worker_builder.get_dir_metadata(
+            os.path.dirname(in_path))
+        _worker_builder.process_src_file(in_path, relative_path,
+                                         dir_metadata, in_stat)
+    except Exception:
+        # The exception is sent back to the main process, but some
+        # exceptions cannot be pickled (such as those of Chameleon,
+        # whose class is created on the fly). Send the traceback
+        # instead.
+        raise RuntimeError('Could not process "%s":\n%s' % (
+            in_path, traceback.format_exc()))
+    return _worker_builder.pop_results()
@@ -10,6 +10,7 @@ from soho.builder import Builder
 from soho.config import ALL_SETTINGS
 from soho.config import PATH_SETTINGS
 from soho.config import REGEXP_SETTINGS
+from soho.utils import ASSET_SYNC_MODES
 
 
 def main():  # pragma: no coverage
@@ -19,12 +20,30 @@ def main():  # pragma: no coverage
     options = parse_args()
     settings = get_settings(options)
     builder = Builder(**settings)
+    # The server and the watcher are imported only if needed, to keep
+    # the startup time low.
+    if getattr(options, 'command', 'build') == 'serve':
+        from soho.server import serve
+        serve(builder, settings['out_dir'], 'localhost', options.port)
+        return
     builder.build()
+    if getattr(options, 'watch', False):
+        from soho.watch import Watcher
+        dirs = [settings[option] for option in (
+                'asset_dir', 'locale_dir', 'src_dir', 'template_dir')]
+        Watcher(builder, dirs).run()
 
 
 def parse_args():  # pragma: no coverage
-    parser = ArgumentParser(usage='%(prog)s [options]')
+    parser = ArgumentParser(usage='%(prog)s [options] [build|serve]')
     add = parser.add_argument
+    add('command',
+        help='"build" (the default) builds the site. "serve" serves the '
+             'site on a local HTTP server and generates requested files '
+             'on the fly if needed.',
+        nargs='?',
+        choices=('build', 'serve'),
+        default='build')
     add('-v', '--version',
         action='version',
         version='%%(prog)s %s' % VERSION)
@@ -48,6 +67,30 @@ def parse_args():  # pragma: no coverage
         help='Dry run: do not create or copy any file or directory.',
         dest='do_nothing',
         action='store_true')
+    add('--prune',
+        help='Remove generated files (and copied assets) whose source '
+             'file has been removed since the previous build.',
+        dest='prune',
+        action='store_true',
+        default=None)
+    add('-w', '--watch',
+        help='After the build, watch source files, assets, templates '
+             'and translations, and process again what is affected by '
+             'a change.',
+        dest='watch',
+        action='store_true')
+    add('-p', '--port',
+        metavar='PORT',
+        help='Listen on PORT with the "serve" command. Default is 8000.',
+        dest='port',
+        type=int,
+        default=8000)
+    add('-j', '--jobs',
+        metavar='JOBS',
+        help='Generate HTML files with JOBS processes in parallel.',
+        dest='jobs',
+        type=int,
+        default=None)
     return parser.parse_args()
 
 
@@ -103,6 +146,25 @@ def get_settings(options):
         if path is not None:
             exit_if_file_absent(path)
 
+    if settings['change_detection'] not in ('mtime', 'hash'):
+        sys.exit('The "change_detection" option must be "mtime" or "hash".')
+    if settings['change_detection'] == 'hash' and not settings['manifest']:
+        sys.exit('The "manifest" option cannot be empty when '
+                 '"change_detection" is "hash".')
+    if settings['asset_sync'] not in ASSET_SYNC_MODES:
+        sys.exit('The "asset_sync" option must be one of: %s.' %
+                 ', '.join('"%s"' % mode for mode in ASSET_SYNC_MODES))
+    if settings['prune'] and not settings['manifest']:
+        sys.exit('The "manifest" option cannot be empty when "prune" is '
+                 'set.')
+    if isinstance(settings['locales'], str):
+        sys.exit('The "locales" option must be a sequence of locales, not '
+                 'a string.')
+    if settings['jobs'] < 1:
+        sys.exit('The "jobs" option must be a positive integer.')
+    if settings['asset_jobs'] < 1:
+        sys.exit('The "asset_jobs" option must be a positive integer.')
+
     # Create output directory if it does not exist already.
     if not settings['do_nothing'] and not os.path.exists(settings['out_dir']):
         os.mkdir(settings['out_dir'])
@@ -126,7 +188,7 @@ def get_settings_from_conf(path):
     """Return settings as a mapping."""
     settings = {}
     with open(path) as fp:
-        exec(fp.read(), {}, settings)
+        exec(compile(fp.read(), path, 'exec'), {}, settings)
     return settings
 
 
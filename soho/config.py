@@ -2,26 +2,38 @@ ENCODING = 'utf-8'
 METADATA_FILE_SUFFIX = '.meta.py'
 
 ALL_SETTINGS = ('asset_dir',
+                'asset_jobs',
+                'asset_sync',
                 'assets_only',
                 'base_url',
+                'cache_dir',
+                'change_detection',
                 'do_nothing',
                 'force',
                 'hide_index_html',
                 'locale_dir',
+                'locales',
                 'ignore_files',
+                'jobs',
                 'logger_level',
                 'logger_path',
+                'manifest',
                 'out_dir',
+                'prune',
                 'src_dir',
                 'sitemap',
+                'sitemap_gzip',
                 'template',
                 'template_dir')
 BOOLEAN_SETTINGS = ('assets_only',
                     'do_nothing',
                     'force',
-                    'hide_index_html_in_path')
+                    'hide_index_html_in_path',
+                    'prune',
+                    'sitemap_gzip')
 REGEXP_SETTINGS = ('ignore_files', )
 PATH_SETTINGS = ('asset_dir',
+                 'cache_dir',
                  'locale_dir',
                  'logfile',
                  'out_dir',
@@ -1,15 +1,24 @@
 DEFAULT_ASSET_DIR = './assets'
+DEFAULT_ASSET_JOBS = 1
+DEFAULT_ASSET_SYNC = 'copy'
 DEFAULT_ASSETS_ONLY = False
 DEFAULT_BASE_URL = 'http://exemple.com/soho/default-base-url'
+DEFAULT_CACHE_DIR = None
+DEFAULT_CHANGE_DETECTION = 'mtime'
 DEFAULT_CONFIG_FILE = 'sohoconf.py'
 DEFAULT_DO_NOTHING = False
 DEFAULT_FORCE = False
 DEFAULT_HIDE_INDEX_HTML = True
 DEFAULT_IGNORE_FILES = ('.*\.DS_Store$', '.*~$')
+DEFAULT_JOBS = 1
 DEFAULT_LOCALE_DIR = './locale'
+DEFAULT_LOCALES = None
 DEFAULT_LOGGER_PATH = '-'
 DEFAULT_LOGGER_LEVEL = 'info'
+DEFAULT_MANIFEST = '.soho-manifest.json'
 DEFAULT_OUT_DIR = './www'
+DEFAULT_PRUNE = False
 DEFAULT_SRC_DIR = './src'
 DEFAULT_SITEMAP = 'sitemap.xml'
+DEFAULT_SITEMAP_GZIP = False
 DEFAULT_TEMPLATE_DIR = './templates'
@@ -1,5 +1,9 @@
 import os
+
+from soho.utils import CodeCache
+from soho.utils import get_plugin
 from soho.utils import read_file_metadata
+from soho.utils import read_front_matter
 from soho.utils import register_plugin
 
 
@@ -25,14 +29,65 @@ def register_generator(spec, *ext):
 
 
 class BaseGenerator(object):
-    """The base class that any generator must implement."""
+    """The base class that any generator must implement.
+
+    The builder creates one instance of the generator per file
+    extension and per build (and per worker process if files are
+    processed in parallel), so that an instance may keep parsers,
+    caches, etc. for all files. ``setup()`` is called after the
+    instance has been created and ``teardown()`` at the end of the
+    build.
+    """
+
+    # Set by ``setup()``.
+    code_cache = None
+
+    def setup(self, cache_dir=None):
+        """Prepare the generator before it is used for the first
+        time.
+
+        ``cache_dir`` is the directory where the generator may keep
+        data between builds (in a subdirectory of its own), or
+        ``None`` if nothing should be kept. By default, compiled
+        metadata files are kept in its ``metadata`` subdirectory.
+        """
+        if cache_dir:
+            cache_dir = os.path.join(cache_dir, 'metadata')
+        self.code_cache = CodeCache(cache_dir or None)
+
+    def teardown(self):
+        """Release resources held by the generator at the end of
+        the build. Does nothing by default.
+        """
 
     def _read_metadata_from_file(self, path):
         """Return metadata about the file at the given ``path`` by
         reading from a file named ``<path>.meta.py`` if such a file
         exists.
         """
-        return read_file_metadata(path)
+        return read_file_metadata(path, self.code_cache)
+
+    def _read_source(self, path):
+        """Return a tuple that consists of the metadata of the file at
+        the given ``path`` (read from its ``.meta.py`` file, if any,
+        and from its front matter, if any) and its content (without
+        the front matter).
+        """
+        meta = self._read_metadata_from_file(path)
+        with open(path, 'r') as in_file:
+            front_matter, source = read_front_matter(in_file.read())
+        meta.update(front_matter)
+        return meta, source
+
+    def read_metadata(self, path):
+        """Return the metadata of the file at the given ``path``,
+        without generating HTML.
+
+        Generators that can read metadata embedded in the source file
+        in a specific format may return more metadata from
+        ``generate()``.
+        """
+        return self._read_source(path)[0]
 
     def generate(self, path):  # pragma: no coverage
         """Return a tuple that consists of the metadata and the HTML
@@ -46,7 +101,7 @@ def get_generator(path, *args, **kwargs):
     ``None`` if none could be found.
     """
     ext = os.path.splitext(path)[1][1:]
-    klass = registry.get(ext, None)
+    klass = get_plugin(registry, ext)
     if klass is None:
         return None
     return klass(*args, **kwargs)
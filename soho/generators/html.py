@@ -8,6 +8,4 @@ from soho.generators import BaseGenerator
 class HTMLGenerator(BaseGenerator):
 
     def generate(self, path):
-        meta = self._read_metadata_from_file(path)
-        with open(path, 'r') as in_file:
-            return meta, in_file.read()
+        return self._read_source(path)
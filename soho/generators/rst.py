@@ -2,16 +2,24 @@
 and return HTML as output.
 """
 
+import copy
+import json
+import os
 import re
 
-from docutils.writers.html4css1 import Writer as BaseWriter
+import docutils
+from docutils.core import Publisher
 from docutils.core import publish_parts
+from docutils.utils import DependencyList
+from docutils.writers.html4css1 import Writer as BaseWriter
 
 # Register Sphinx directives if Sphinx is available.
 try:
     # Importing the 'code' module registers the directives.
+    import sphinx
     from sphinx.directives import code
     code  # makes pyflakes happy
+    SPHINX_VERSION = sphinx.__version__
 
     # 'sphinx.writers.html.HTMLTranslator' provides the necessary
     # visitors to handle extra directives defined by Sphinx. It needs
@@ -31,41 +39,145 @@ try:
             name = '.'.join((self.name, attr))
             return Mock(name)
     class HTMLTranslatorWrapper(HTMLTranslator):
+        # The builder (and its highlighter) is created only once and
+        # shared by all translators.
+        _builder = None
         def __init__(self, *args, **kwargs):
-            builder = FakeBuilder()
+            if HTMLTranslatorWrapper._builder is None:
+                HTMLTranslatorWrapper._builder = FakeBuilder()
+            builder = HTMLTranslatorWrapper._builder
             HTMLTranslator.__init__(self, builder, *args, **kwargs)
     class Writer(BaseWriter):
         def __init__(self, *args, **kwargs):
             BaseWriter.__init__(self, *args, **kwargs)
             self.translator_class = HTMLTranslatorWrapper
 except ImportError:  # pragma: no cover
+    SPHINX_VERSION = None
     Writer = BaseWriter
 
+# Pygments highlights code blocks (through docutils or Sphinx) when it
+# is installed.
+try:
+    import pygments
+    PYGMENTS_VERSION = pygments.__version__
+except ImportError:  # pragma: no cover
+    PYGMENTS_VERSION = None
+
+import soho
 from soho.config import ENCODING
 from soho.generators import BaseGenerator
+from soho.utils import FragmentCache
 
 
 DOCUTILS_SETTINGS = {'strip_comments': True,
                      'output_encoding': ENCODING,
                      'initial_header_level': 2}
 META_REGEXP = re.compile('<meta content="(.*?)" name="(.*?)".*?>')
+DOCUTILS_DIR = os.path.dirname(os.path.abspath(docutils.__file__))
+# The HTML generated from a source depends on the versions of docutils,
+# Sphinx, Pygments and Soho itself and on the settings, hence their
+# presence in cache keys.
+CACHE_KEY_PREFIX = json.dumps(
+    [docutils.__version__, SPHINX_VERSION, PYGMENTS_VERSION,
+     soho.__version__, DOCUTILS_SETTINGS],
+    sort_keys=True)
+
+
+class RSTPublisher(object):
+    """Convert reStructuredText to HTML parts with the same docutils
+    components (reader, parser and writer) and settings for all
+    documents.
+
+    Setting up docutils (building the option parser, reading
+    configuration files, etc.) takes much longer than converting a
+    typical document, so it is done only once, when the first document
+    is converted. This is not thread-safe.
+    """
+
+    def __init__(self, settings_overrides):
+        self.settings_overrides = settings_overrides
+        self._publisher = None
+
+    def _setup(self):
+        publisher = Publisher(reader='standalone',
+                              parser='restructuredtext',
+                              writer=Writer())
+        publisher.process_programmatic_settings(
+            None, self.settings_overrides, None)
+        self._publisher = publisher
+
+    def publish_parts(self, source):
+        """Return a tuple that consists of the parts of the HTML
+        document generated from ``source`` (as returned by
+        ``docutils.core.publish_parts()``) and the list of the files
+        that the document includes. Files of docutils itself (such as
+        the stylesheet of the writer) are not listed.
+        """
+        if self._publisher is None:
+            self._setup()
+        publisher = self._publisher
+        # Settings are modified while processing a document (the
+        # source path, for example): use a copy.
+        settings = copy.copy(publisher.settings)
+        settings.record_dependencies = DependencyList()
+        parts = publish_parts(source,
+                              reader=publisher.reader,
+                              parser=publisher.parser,
+                              writer=publisher.writer,
+                              settings=settings)
+        dependencies = [path for path in settings.record_dependencies.list
+                        if not path.startswith(DOCUTILS_DIR)]
+        return parts, dependencies
+
+
+publisher = RSTPublisher(DOCUTILS_SETTINGS)
+
+
+def convert(source, fragment_cache):
+    """Return a tuple that consists of the metadata embedded in
+    ``source`` with the ``meta`` directive and the HTML fragment
+    generated from ``source``.
+
+    The result is cached in ``fragment_cache`` (a
+    :class:`soho.utils.FragmentCache`), unless the document includes
+    other files, since they are not part of the key.
+    """
+    key = fragment_cache.make_key(CACHE_KEY_PREFIX, source)
+    cached = fragment_cache.get(key)
+    if cached is not None:
+        return cached['meta'], cached['body']
+    parts, dependencies = publisher.publish_parts(source)
+    meta = {}
+    if parts['meta']:
+        for value, name in META_REGEXP.findall(parts['meta']):
+            meta[name] = value
+    body = parts['body'].strip()
+    if not dependencies:
+        fragment_cache.set(key, {'meta': meta, 'body': body})
+    return meta, body
 
 
 class RSTGenerator(BaseGenerator):
 
+    # Set by ``setup()``. The default cache does not store anything.
+    fragment_cache = FragmentCache()
+
+    def setup(self, cache_dir=None):
+        BaseGenerator.setup(self, cache_dir)
+        # HTML fragments are stored in the 'fragments' subdirectory.
+        if cache_dir:
+            self.fragment_cache = FragmentCache(
+                os.path.join(cache_dir, 'fragments'))
+
     def generate(self, path):
-        with open(path, 'r') as in_file:
-            writer = Writer()
-            parts = publish_parts(in_file.read(),
-                                  writer=writer,
-                                  settings_overrides=DOCUTILS_SETTINGS)
-        # Read metadata from a '.meta.py' file it one exists
-        meta = self._read_metadata_from_file(path)
+        # Read metadata from a '.meta.py' file it one exists, and from
+        # the front matter of the file.
+        meta, source = self._read_source(path)
+        embedded_meta, body = convert(source, self.fragment_cache)
         # And update (or create) from metadata embedded in the source
-        # file itself.
-        for value, key in META_REGEXP.findall(parts['meta']):
-            meta[key] = value
-        return meta, parts['body'].strip()
+        # file itself with the 'meta' directive.
+        meta.update(embedded_meta)
+        return meta, body
 
 
 ReSTGenerator = RSTGenerator  # </pedantic>
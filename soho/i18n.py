@@ -1,11 +1,179 @@
-from gettext import GNUTranslations
+from collections import OrderedDict
+import mmap
 import os
 import re
+import struct
 
 from translationstring import Translator
 
 
-INTERPOLATE_REGEXP = re.compile('\${(\w*)}')
+INTERPOLATE_REGEXP = re.compile(r'\${(?P<name>\w*)}')
+
+# Markers that ``translationstring`` replaces in translated messages:
+# ``$name`` and ``${name}`` (but not ``$$name``).
+TRANSLATION_MARKER_REGEXP = re.compile(
+    r'(?<!\$)\$(?P<brace>{)?(?P<name>[a-zA-Z][-a-zA-Z0-9_]*)(?(brace)})')
+
+# Magic number of ``.mo`` files, as read in their own byte order.
+MO_MAGIC = 0x950412de
+
+# Maximum number of translated messages that are kept by
+# ``TranslatorWrapper``.
+MEMO_SIZE = 4096
+
+
+class Interpolation(object):
+    """A string in which interpolation markers have been located once
+    for all. Calling it with a mapping returns the string where known
+    markers have been replaced by their value, without parsing the
+    string again.
+    """
+
+    __slots__ = ('text', '_literals', '_markers')
+
+    def __init__(self, text, regexp=INTERPOLATE_REGEXP):
+        self.text = text
+        self._literals = literals = []
+        self._markers = markers = []
+        position = 0
+        for match in regexp.finditer(text):
+            literals.append(text[position:match.start()])
+            markers.append((match.group('name'), match.group(0)))
+            position = match.end()
+        literals.append(text[position:])
+
+    def __call__(self, mapping):
+        if not mapping or not self._markers:
+            return self.text
+        literals = self._literals
+        chunks = [literals[0]]
+        for i, (name, whole) in enumerate(self._markers, 1):
+            chunks.append(str(mapping.get(name, whole)))
+            chunks.append(literals[i])
+        return ''.join(chunks)
+
+
+def hash_string(s):
+    """Return the hash of the given bytes ``s``, as computed by GNU
+    gettext to build the hash table of ``.mo`` files.
+    """
+    hval = 0
+    for c in s:
+        hval = (hval << 4) + c
+        g = hval & 0xf0000000
+        if g:
+            hval ^= g >> 24
+            hval ^= g
+    return hval
+
+
+class MOCatalog(object):
+    """A gettext catalog read from a ``.mo`` file that is mapped in
+    memory. Unlike ``gettext.GNUTranslations``, messages are not all
+    decoded and stored in a dictionary: each message is looked up
+    when it is requested, with the hash table of the file if it has
+    one (as generated by GNU ``msgfmt``), or with a binary search in
+    the (sorted) table of original strings otherwise.
+
+    Like ``GNUTranslations.gettext()``, ``gettext()`` ignores
+    messages that have plural forms.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as fp:
+            try:
+                self._data = mmap.mmap(fp.fileno(), 0,
+                                       access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
+                raise OSError(0, 'Bad magic number', path)
+        data = self._data
+        if len(data) < 28:
+            self.close()
+            raise OSError(0, 'Bad magic number', path)
+        for byte_order in ('<', '>'):
+            if struct.unpack(byte_order + 'I', data[:4])[0] == MO_MAGIC:
+                break
+        else:
+            self.close()
+            raise OSError(0, 'Bad magic number', path)
+        (revision, self._count, self._originals, self._translations,
+         self._hash_size, self._hash_table) = \
+            struct.unpack(byte_order + '6I', data[4:28])
+        if revision >> 16 > 1:
+            self.close()
+            raise OSError(0, 'Bad version number %d' % (revision >> 16),
+                          path)
+        self._descriptor = struct.Struct(byte_order + '2I')
+        self._hash_entry = struct.Struct(byte_order + 'I')
+        self.charset = 'ascii'
+        header = self._lookup(b'')
+        if header is not None:
+            for line in header.decode().splitlines():
+                name, _, value = line.partition(':')
+                if name.strip().lower() == 'content-type':
+                    _, _, charset = value.partition('charset=')
+                    if charset.strip():
+                        self.charset = charset.strip()
+
+    def close(self):
+        self._data.close()
+
+    def _get_original(self, index):
+        length, offset = self._descriptor.unpack_from(
+            self._data, self._originals + 8 * index)
+        return self._data[offset:offset + length]
+
+    def _get_translation(self, index):
+        length, offset = self._descriptor.unpack_from(
+            self._data, self._translations + 8 * index)
+        return self._data[offset:offset + length]
+
+    def _find(self, key):
+        """Return the index of the given original bytes ``key``, or
+        ``None`` if there is no such message.
+        """
+        size = self._hash_size
+        if size > 2:
+            hval = hash_string(key)
+            index = hval % size
+            increment = 1 + hval % (size - 2)
+            while True:
+                entry = self._hash_entry.unpack_from(
+                    self._data, self._hash_table + 4 * index)[0]
+                if not entry:
+                    return None
+                original = self._get_original(entry - 1)
+                if original.split(b'\0', 1)[0] == key:
+                    return entry - 1
+                index = (index + increment) % size
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            original = self._get_original(middle).split(b'\0', 1)[0]
+            if original == key:
+                return middle
+            if original < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def _lookup(self, key):
+        index = self._find(key)
+        if index is None or b'\0' in self._get_original(index):
+            return None
+        return self._get_translation(index)
+
+    def gettext(self, message):
+        try:
+            key = message.encode(self.charset)
+        except UnicodeEncodeError:
+            return message
+        translation = self._lookup(key)
+        if translation is None:
+            return message
+        return translation.decode(self.charset)
 
 
 def interpolate(s, mapping):
@@ -14,43 +182,106 @@ def interpolate(s, mapping):
     """
     if not mapping:
         return s
-    def _sub(matchobj):
-        var = matchobj.group(1)
-        return mapping.get(var, matchobj.group(0))
-    return INTERPOLATE_REGEXP.sub(_sub, s)
+    return Interpolation(s)(mapping)
 
 
 class TranslatorWrapper(object):
-    """A wrapper that holds instances of ``gettext.GNUTranslations``
+    """A wrapper that holds catalogs (as :class:`MOCatalog` instances)
     and takes care of choosing the right one depending on the domain
     and the locale that are requested at translation time.
+
+    A catalog is loaded only when a message is translated in its
+    locale and domain for the first time.
+
+    The same messages are translated on every page. Translated
+    messages are thus kept (as :class:`Interpolation` instances) in a
+    memo keyed on the locale, the domain and the message id, from
+    which the least recently used ones are discarded when it holds
+    more than ``memo_size`` messages.
     """
 
-    def __init__(self, locale_dir):
+    def __init__(self, locale_dir, memo_size=MEMO_SIZE):
         self.translators = {}
+        self.memo_size = memo_size
+        self._catalogs = []
+        self._memo = OrderedDict()
+        self._hits = 0
+        self._misses = 0
         self.load_translations(locale_dir)
 
     def load_translations(self, locale_dir):
-        """Load translations from files located in ``locale_dir``."""
-        for locale in os.listdir(locale_dir):
-            locale_path = os.path.join(locale_dir, locale)
-            if not os.path.isdir(locale_path):
-                continue
-            self.translators[locale] = {}
-            msg_dir_path = os.path.join(locale_path, 'LC_MESSAGES')
-            for filename in os.listdir(msg_dir_path):
-                if not filename.endswith('.mo'):
-                    continue
-                domain = filename[:-3]
-                mo_path = os.path.join(msg_dir_path, filename)
-                with open(mo_path, 'rb') as fp:
-                    translator = Translator(GNUTranslations(fp))
-                    self.translators[locale][domain] = translator
+        """Forget catalogs that have been loaded so far. Catalogs will
+        be loaded from files located in ``locale_dir``.
+        """
+        self.close()
+        self.locale_dir = locale_dir
+        self.translators = {}
+        self._memo.clear()
+
+    def close(self):
+        """Unmap catalogs that have been loaded."""
+        for catalog in self._catalogs:
+            catalog.close()
+        self._catalogs = []
+
+    def get_translator(self, locale, domain):
+        """Return the translator of the given ``locale`` and
+        ``domain``, or ``None`` if there is no such catalog.
+        """
+        key = (locale, domain)
+        try:
+            return self.translators[key]
+        except KeyError:
+            pass
+        translator = None
+        if locale and domain:
+            mo_path = os.path.join(self.locale_dir, locale, 'LC_MESSAGES',
+                                   domain + '.mo')
+            if os.path.isfile(mo_path):
+                catalog = MOCatalog(mo_path)
+                self._catalogs.append(catalog)
+                translator = Translator(catalog)
+        self.translators[key] = translator
+        return translator
 
     def translate(self, locale, msgid, domain, mapping):
         """Translate ``msgid`` in the requested ``locale``."""
+        if msgid.__class__ is not str:
+            # Translation strings carry their own default and
+            # mapping: let ``translationstring`` handle them.
+            return self._translate(locale, msgid, domain, mapping)
+        key = (locale, domain, msgid)
         try:
-            translator = self.translators[locale][domain]
+            interpolation = self._memo[key]
         except KeyError:
+            self._misses += 1
+            interpolation = self._get_interpolation(locale, msgid, domain)
+            if len(self._memo) >= self.memo_size:
+                self._memo.popitem(last=False)
+            self._memo[key] = interpolation
+        else:
+            self._hits += 1
+            self._memo.move_to_end(key)
+        return interpolation(mapping)
+
+    def _translate(self, locale, msgid, domain, mapping):
+        translator = self.get_translator(locale, domain)
+        if translator is None:
             return interpolate(msgid, mapping)
         return translator(msgid, domain, mapping)
+
+    def _get_interpolation(self, locale, msgid, domain):
+        translator = self.get_translator(locale, domain)
+        if translator is None:
+            return Interpolation(msgid)
+        return Interpolation(translator(msgid, domain),
+                             TRANSLATION_MARKER_REGEXP)
+
+    def pop_stats(self):
+        """Return and reset the number of translations that have been
+        found in the memo (hits) and the number of translations that
+        have been looked up in the catalogs (misses).
+        """
+        stats = (self._hits, self._misses)
+        self._hits = self._misses = 0
+        return stats
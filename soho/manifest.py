@@ -0,0 +1,231 @@
+"""Define the ``Manifest``, which records the files that each generated
+file depends on (source file, metadata files, template, translation
+catalogs), so that a build regenerates only the files whose
+dependencies have changed.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+
+MANIFEST_VERSION = 2
+
+
+def file_digest(path):
+    """Return the digest of the content of the file at the given
+    ``path``, or ``None`` if the file does not exist.
+    """
+    digest = hashlib.sha1()
+    try:
+        with open(path, 'rb') as fp:
+            for chunk in iter(lambda: fp.read(65536), b''):
+                digest.update(chunk)
+    except (IOError, OSError):
+        return None
+    return digest.hexdigest()
+
+
+class Manifest(object):
+    """A record of the dependencies of each generated file, stored as
+    a JSON file in the output directory.
+
+    Generated files are identified by their path relative to the
+    output directory. Dependencies are identified by their absolute
+    path and associated with the digest of their content (or ``None``
+    if the file did not exist, so that creating it is noticed). On the
+    disk, paths of dependencies are stored relative to the directory
+    of the manifest, so that the manifest does not disclose local
+    paths if it is deployed along with the web site.
+
+    The manifest also keeps the digest of each dependency along with
+    its size and modification time. As long as they do not change, the
+    file is not read again to compute its digest.
+
+    Finally, the manifest holds the data of the Sitemap (see
+    :class:`soho.utils.SitemapStore`).
+
+    ``digest()`` and ``is_outdated()`` may be called from several
+    threads (see ``Builder.copy_assets_in_parallel()``). Other methods
+    must be called from the main thread only.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.outputs = {}
+        self.digests = {}
+        self.sitemap = {}
+        self._updates = {}
+        self._digest_updates = {}
+        self._digests = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Load the manifest from the disk, if it exists."""
+        try:
+            with open(self.path) as fp:
+                data = json.load(fp)
+        except (IOError, OSError, ValueError):
+            return
+        # A manifest written by another version of Soho is ignored, as
+        # if there were none.
+        if data.get('version') != MANIFEST_VERSION:
+            return
+        try:
+            outputs = data['outputs']
+            digests = data['digests']
+            sitemap = data['sitemap']
+        except KeyError:
+            return
+        absolute = self._get_absolute_path
+        self.outputs = dict(
+            (key, {'source': absolute(entry['source']),
+                   'deps': dict((absolute(path), digest)
+                                for path, digest in entry['deps'].items())})
+            for key, entry in outputs.items())
+        self.digests = dict((absolute(path), digest)
+                            for path, digest in digests.items())
+        self.sitemap = sitemap
+
+    def save(self):
+        """Write the manifest on the disk, if it has been modified."""
+        if not self._dirty:
+            return
+        # Forget digests of files that are not a dependency anymore.
+        used = set()
+        for entry in self.outputs.values():
+            used.update(entry['deps'])
+        relative = self._get_relative_path
+        digests = dict((relative(path), digest)
+                       for path, digest in self.digests.items()
+                       if path in used)
+        outputs = dict(
+            (key, {'source': relative(entry['source']),
+                   'deps': dict((relative(path), digest)
+                                for path, digest in entry['deps'].items())})
+            for key, entry in self.outputs.items())
+        data = {'version': MANIFEST_VERSION,
+                'digests': digests,
+                'outputs': outputs,
+                'sitemap': self.sitemap}
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as fp:
+            json.dump(data, fp, indent=0, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+    def _get_relative_path(self, path):
+        base_dir = os.path.dirname(os.path.abspath(self.path))
+        try:
+            return os.path.relpath(path, base_dir)
+        except ValueError:  # pragma: no cover
+            # On Windows, if ``path`` is on another drive.
+            return path
+
+    def _get_absolute_path(self, path):
+        base_dir = os.path.dirname(os.path.abspath(self.path))
+        return os.path.normpath(os.path.join(base_dir, path))
+
+    def touch(self):
+        """Mark the manifest as modified, so that it is written by the
+        next call to ``save()``. This is needed if ``sitemap`` has
+        been modified.
+        """
+        self._dirty = True
+
+    def digest(self, path):
+        """Return the digest of the given file. Digests are computed
+        only once per build, and only if the size or the modification
+        time of the file has changed since the digest was recorded.
+        """
+        try:
+            return self._digests[path]
+        except KeyError:
+            pass
+        try:
+            stat = os.stat(path)
+        except OSError:
+            digest = None
+        else:
+            signature = [stat.st_size, stat.st_mtime]
+            recorded = self.digests.get(path)
+            if recorded is not None and recorded[:2] == signature:
+                digest = recorded[2]
+            else:
+                # The file is read outside of the lock, so that several
+                # threads can compute digests at the same time.
+                digest = file_digest(path)
+                with self._lock:
+                    self.digests[path] = self._digest_updates[path] = \
+                        signature + [digest]
+                    self._dirty = True
+        with self._lock:
+            self._digests[path] = digest
+        return digest
+
+    def forget_digests(self):
+        """Forget digests that have been computed during the current
+        build, so that modified files are noticed by the next build.
+        """
+        self._digests = {}
+
+    def get_dependents(self, path):
+        """Return the source files of all generated files that depend
+        on the given ``path``.
+        """
+        return set(entry['source'] for entry in self.outputs.values()
+                   if path in entry['deps'])
+
+    def is_outdated(self, key, deps):
+        """Return whether the generated file identified by ``key``
+        must be generated again, i.e. if it is not in the manifest,
+        if one of its recorded dependencies has changed or if one of
+        the given ``deps`` is a new dependency.
+        """
+        try:
+            recorded = self.outputs[key]['deps']
+        except KeyError:
+            return True
+        for path in deps:
+            if path not in recorded:
+                return True
+        for path, digest in recorded.items():
+            if self.digest(path) != digest:
+                return True
+        return False
+
+    def record(self, key, source, deps):
+        """Record that the generated file identified by ``key`` has
+        been generated from ``source`` and depends on ``deps``.
+        """
+        entry = {'source': source,
+                 'deps': dict((path, self.digest(path)) for path in deps)}
+        self.outputs[key] = self._updates[key] = entry
+        self._dirty = True
+
+    def forget(self, key):
+        """Forget the generated file identified by ``key``."""
+        del self.outputs[key]
+        self._updates.pop(key, None)
+        self._dirty = True
+
+    def pop_updates(self):
+        """Return and reset entries and digests that have been
+        recorded since the last call.
+        """
+        updates = {'digests': self._digest_updates,
+                   'outputs': self._updates}
+        self._digest_updates = {}
+        self._updates = {}
+        return updates
+
+    def update(self, updates):
+        """Add entries and digests that have been recorded by another
+        manifest (usually in a worker process).
+        """
+        self.digests.update(updates['digests'])
+        self.outputs.update(updates['outputs'])
+        self._dirty = True
@@ -1,4 +1,5 @@
 import os
+from soho.utils import get_plugin
 from soho.utils import register_plugin
 
 
@@ -27,11 +28,40 @@ class BaseRenderer(object):
 
     There is only one renderer for now, so the API is subject to
     change (as soon as a second renderer is implemented).
+
+    The builder creates one instance of the renderer per template
+    (and per worker process if files are processed in parallel) and
+    keeps it as long as the template is not modified. ``setup()`` is
+    called after the instance has been created and ``teardown()``
+    when it is discarded.
     """
 
     def __init__(self, template_path):  # pragma: no coverage
         raise NotImplementedError
 
+    def setup(self, cache_dir=None):
+        """Prepare the renderer before it is used for the first
+        time. Does nothing by default.
+
+        ``cache_dir`` is the directory where the renderer may keep
+        data between builds (in a subdirectory of its own), or
+        ``None`` if nothing should be kept.
+        """
+
+    def teardown(self):
+        """Release resources held by the renderer when it is
+        discarded. Does nothing by default.
+        """
+
+    def get_dependencies(self):
+        """Return the paths of the files (other than the template
+        itself) that the template depends on, for example templates
+        whose macros it uses. Generated files are generated again
+        when one of these files changes. Return an empty list by
+        default.
+        """
+        return []
+
     def render(self, **bindings):  # pragma: no coverage
         """Render the template with the given ``bindings``."""
         raise NotImplementedError
@@ -42,7 +72,7 @@ def get_renderer(path, *args, **kwargs):
     could be found.
     """
     ext = os.path.splitext(path)[1][1:]
-    klass = registry.get(ext, None)
+    klass = get_plugin(registry, ext)
     if klass is None:
         return None
     return klass(path, *args, **kwargs)
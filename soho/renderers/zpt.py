@@ -2,16 +2,107 @@
 Templates).
 """
 
+import os
+import re
+
 from chameleon import PageTemplateFile
+from chameleon.loader import ModuleLoader
 
 from soho.config import ENCODING
 from soho.renderers import BaseRenderer
 
 
+# Matches the path of templates that are loaded by ``load:``
+# expressions, usually to use their macros (for example
+# ``metal:use-macro="load: layout.pt"``).
+LOAD_REGEXP = re.compile(r'load:\s*([^\s"\'|;]+)')
+
+_loaders = {}
+
+
+def get_module_loader(cache_dir):
+    """Return a Chameleon loader that stores compiled templates (as
+    Python modules) in ``cache_dir``.
+
+    Modules are named after the digest of the template, which
+    includes its content and the versions of Chameleon (and of other
+    installed packages). A compiled template is thus never reused
+    after the template or Chameleon has changed.
+    """
+    try:
+        return _loaders[cache_dir]
+    except KeyError:
+        pass
+    os.makedirs(cache_dir, exist_ok=True)
+    loader = _loaders[cache_dir] = ModuleLoader(cache_dir)
+    return loader
+
+
+def find_loaded_templates(path):
+    """Return the paths of the templates that are loaded by the
+    template at ``path`` (with ``load:`` expressions), and by these
+    templates, recursively.
+
+    Like Chameleon does, relative paths are looked up in the
+    directory of the loading template, then in the directories of the
+    templates that loaded it. Paths that are computed at rendering
+    time (``load: ${name}.pt``) or that refer to a package cannot be
+    known and are ignored.
+    """
+    found = []
+    seen = set([os.path.normpath(path)])
+    pending = [(path, ())]
+    while pending:
+        path, search_path = pending.pop(0)
+        search_path = (os.path.dirname(path), ) + search_path
+        try:
+            with open(path, encoding=ENCODING, errors='replace') as fp:
+                source = fp.read()
+        except (IOError, OSError):
+            continue
+        for spec in LOAD_REGEXP.findall(source):
+            if os.path.isabs(spec):
+                candidates = [spec]
+            elif '$' in spec or ':' in spec:
+                continue
+            else:
+                candidates = [os.path.join(dir_path, spec)
+                              for dir_path in search_path]
+            loaded = candidates[0]
+            for candidate in candidates:
+                if os.path.exists(candidate):
+                    loaded = candidate
+                    break
+            loaded = os.path.normpath(loaded)
+            if loaded in seen:
+                continue
+            seen.add(loaded)
+            found.append(loaded)
+            pending.append((loaded, search_path))
+    return found
+
+
 class ZPTRenderer(BaseRenderer):
     def __init__(self, filename, translate):
-        self.template = PageTemplateFile(
-            filename, encoding=ENCODING, translate=translate)
+        self.filename = filename
+        self.translate = translate
+        self.template = self._make_template()
+        self.dependencies = find_loaded_templates(filename)
+
+    def setup(self, cache_dir=None):
+        # Compiled templates are stored in the 'templates' subdirectory.
+        if cache_dir:
+            loader = get_module_loader(os.path.join(cache_dir, 'templates'))
+            self.template = self._make_template(loader=loader)
+
+    def _make_template(self, **config):
+        # The configuration (including the loader) is passed on to
+        # templates that are loaded by this one.
+        return PageTemplateFile(self.filename, encoding=ENCODING,
+                                translate=self.translate, **config)
+
+    def get_dependencies(self):
+        return self.dependencies
 
     def render(self, **bindings):
         return self.template.render(**bindings)
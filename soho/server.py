@@ -0,0 +1,48 @@
+"""Define a development server that serves the generated web site and
+generates requested files on the fly if their source file has been
+modified.
+"""
+
+from functools import partial
+from http.server import HTTPServer
+from http.server import SimpleHTTPRequestHandler
+from urllib.parse import unquote
+from urllib.parse import urlsplit
+
+
+class RequestHandler(SimpleHTTPRequestHandler):
+    """A request handler that asks the builder to generate (or copy)
+    the requested file before serving it.
+    """
+
+    def send_head(self):
+        builder = self.server.builder
+        url_path = unquote(urlsplit(self.path).path)
+        sources = builder.find_sources(url_path)
+        if sources:
+            builder.rebuild(sources, update_sitemap=False)
+        return SimpleHTTPRequestHandler.send_head(self)
+
+    def log_message(self, fmt, *args):
+        self.server.builder.logger.debug(fmt, *args)
+
+
+def make_server(builder, out_dir, host, port):
+    """Return an HTTP server that serves files from ``out_dir``."""
+    handler = partial(RequestHandler, directory=out_dir)
+    server = HTTPServer((host, port), handler)
+    server.builder = builder
+    return server
+
+
+def serve(builder, out_dir, host, port):  # pragma: no coverage
+    """Serve the web site until interrupted."""
+    server = make_server(builder, out_dir, host, port)
+    builder.logger.info('Serving "%s" on http://%s:%d/ (press Ctrl-C to '
+                        'stop)...', out_dir, host, server.server_port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        builder.logger.info('Stopped serving.')
+    finally:
+        server.server_close()
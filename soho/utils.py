@@ -1,10 +1,28 @@
+from collections.abc import Mapping
+import gzip
+from hashlib import sha1
+import heapq
+from importlib.util import MAGIC_NUMBER
+import io
+from itertools import islice
+import json
+import marshal
 import os.path
 import logging
+import re
+import shutil
+import tempfile
 import time
 
 from soho.config import METADATA_FILE_SUFFIX
 
 
+# Maximum number of URLs in a single Sitemap file, as defined by the
+# protocol.
+SITEMAP_MAX_URLS = 50000
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
 def register_plugin(registry, spec, *keys):
     """Register a plugin.
 
@@ -25,6 +43,11 @@ def register_plugin(registry, spec, *keys):
         supposed to be a file extension (without the dot, for example
         ``'html'``).
 
+    The plugin is not imported here but by the first call to
+    ``get_plugin()`` for one of its keys, so that the dependencies of
+    a plugin (docutils, for example) are imported only if the plugin
+    is used.
+
     This function is not part of the API. You should use
     ``soho.generator.register_generator()`` or
     ``soho.renderers.register_renderer()`` instead.
@@ -32,35 +55,363 @@ def register_plugin(registry, spec, *keys):
     if not keys:
         raise ValueError('You must provide at least one key to '
                          'register a plugin to.')
-    module, klass = spec.rsplit('.', 1)
+    for key in keys:
+        registry[key] = spec
+
+
+def get_plugin(registry, key):
+    """Return the plugin registered under ``key`` in the given
+    ``registry``, or ``None`` if there is none or if it cannot be
+    imported.
+    """
+    plugin = registry.get(key, None)
+    if not isinstance(plugin, str):
+        return plugin
+    spec = plugin
     try:
-        plugin = __import__(module)
+        plugin = __import__(spec.rsplit('.', 1)[0])
         for component in spec.split('.')[1:]:
             plugin = getattr(plugin, component)
-        for key in keys:
-            registry[key] = plugin
     except ImportError:
         logging.debug('Could not import plugin: "%s".', spec)
+        plugin = None
+    # Replace the spec under all keys of the plugin, so that it is
+    # imported only once.
+    for other_key, other_spec in list(registry.items()):
+        if other_spec == spec:
+            if plugin is None:
+                del registry[other_key]
+            else:
+                registry[other_key] = plugin
+    return plugin
+
+
+class CodeCache(object):
+    """A cache of compiled Python files (metadata files and
+    configuration files).
+
+    Compiled code objects are kept in memory as long as the size and
+    the modification time of the file do not change. If
+    ``cache_dir`` is set, they are also stored in this directory
+    (like Python does in ``__pycache__``) so that files are not
+    compiled again by the next run.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self._codes = {}
+
+    def get_code(self, path):
+        """Return the code object compiled from the file at the given
+        ``path``. Raise ``OSError`` if the file does not exist.
+        """
+        stat = os.stat(path)
+        signature = (stat.st_mtime, stat.st_size)
+        try:
+            cached_signature, code = self._codes[path]
+        except KeyError:
+            pass
+        else:
+            if cached_signature == signature:
+                return code
+        with open(path, 'rb') as fp:
+            source = fp.read()
+        code = self._load(path, source)
+        self._codes[path] = (signature, code)
+        return code
+
+    def _load(self, path, source):
+        if self.cache_dir is None:
+            return compile(source, path, 'exec')
+        # The format of code objects depends on the version of Python,
+        # hence the magic number in the key.
+        key = sha1(MAGIC_NUMBER + path.encode('utf-8') + b'\0' + source)
+        cache_path = os.path.join(self.cache_dir, key.hexdigest())
+        try:
+            with open(cache_path, 'rb') as fp:
+                return marshal.load(fp)
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            pass
+        code = compile(source, path, 'exec')
+        try:
+            if not os.path.exists(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            tmp_path = '%s.%d.tmp' % (cache_path, os.getpid())
+            with open(tmp_path, 'wb') as fp:
+                marshal.dump(code, fp)
+            os.replace(tmp_path, cache_path)
+        except (IOError, OSError):
+            logging.debug('Could not write compiled file in "%s".',
+                          cache_path)
+        return code
+
+
+class FragmentCache(object):
+    """An on-disk cache of data (such as HTML fragments) that is
+    expensive to generate from source files.
 
+    Values must be JSON-serializable. They are stored in ``cache_dir``
+    under the digest of the key (which should include the content of
+    the source file, the version of the tool that converted it, etc.).
+    If ``cache_dir`` is not set, nothing is cached.
 
-def _read_metadata_from_file(path):
+    Entries are never evicted: the files of outdated keys stay in
+    ``cache_dir`` until it is removed by hand, which is always safe.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+
+    def make_key(self, *parts):
+        """Return a key made of the given strings."""
+        key = sha1()
+        for part in parts:
+            key.update(part.encode('utf-8'))
+            key.update(b'\0')
+        return key.hexdigest()
+
+    def get(self, key):
+        """Return the value associated to ``key``, or ``None`` if
+        there is none.
+        """
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(os.path.join(self.cache_dir, key)) as fp:
+                return json.load(fp)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def set(self, key, value):
+        """Associate ``value`` to ``key``."""
+        if self.cache_dir is None:
+            return
+        cache_path = os.path.join(self.cache_dir, key)
+        try:
+            if not os.path.exists(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            tmp_path = '%s.%d.tmp' % (cache_path, os.getpid())
+            with open(tmp_path, 'w') as fp:
+                json.dump(value, fp)
+            os.replace(tmp_path, cache_path)
+        except (IOError, OSError):
+            logging.debug('Could not write cached data in "%s".',
+                          cache_path)
+
+
+def _read_metadata_from_file(path, code_cache):
     metadata = {}
-    if os.path.exists(path):
-        with open(path) as fp:
-            exec(fp.read(), {}, metadata)
+    if code_cache is None:
+        code_cache = CodeCache()
+    try:
+        code = code_cache.get_code(path)
+    except (IOError, OSError):
+        return metadata
+    exec(code, {}, metadata)
     return metadata
 
 
-def read_file_metadata(file_path):
-    """Return metadata associated to the given file (if any)."""
+def read_file_metadata(file_path, code_cache=None):
+    """Return metadata associated to the given file (if any).
+
+    The metadata file is compiled with ``code_cache`` (a
+    :class:`CodeCache`), if given.
+    """
     path = '%s%s' % (file_path, METADATA_FILE_SUFFIX)
-    return _read_metadata_from_file(path)
+    return _read_metadata_from_file(path, code_cache)
 
 
-def read_dir_metadata(dir_path):
-    """Return metadata associated to the given directory (if any)."""
+def read_dir_metadata(dir_path, code_cache=None):
+    """Return metadata associated to the given directory (if any).
+
+    The metadata file is compiled with ``code_cache`` (a
+    :class:`CodeCache`), if given.
+    """
     path = os.path.join(dir_path, METADATA_FILE_SUFFIX)
-    return _read_metadata_from_file(path)
+    return _read_metadata_from_file(path, code_cache)
+
+
+class Metadata(Mapping):
+    """A dictionary-like object that holds metadata of a file or a
+    directory and inherits metadata of its parent directory.
+
+    Each ``Metadata`` object has its own layer of values and a
+    reference to its parent. Creating a child is thus cheap: the
+    metadata of the parents is not copied. Values are looked up in
+    the object's own layer first, then in the parents. Setting a value
+    modifies only the object's own layer, never the parents.
+
+    Note that values themselves are not copied: a mutable value
+    (e.g. a list) defined in a directory is shared by all files of
+    this directory and should not be modified in place.
+    """
+
+    __slots__ = ('_layer', '_parent')
+
+    def __init__(self, layer=None, parent=None):
+        self._layer = layer if layer is not None else {}
+        self._parent = parent
+
+    def child(self, layer=None):
+        """Return a new ``Metadata`` object that inherits from this
+        one, with the given ``layer`` of values (a dictionary, which
+        is not copied).
+        """
+        return Metadata(layer, self)
+
+    def __getitem__(self, key):
+        metadata = self
+        while metadata is not None:
+            try:
+                return metadata._layer[key]
+            except KeyError:
+                metadata = metadata._parent
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        self._layer[key] = value
+
+    def __contains__(self, key):
+        metadata = self
+        while metadata is not None:
+            if key in metadata._layer:
+                return True
+            metadata = metadata._parent
+        return False
+
+    def _get_layers(self):
+        layers = []
+        metadata = self
+        while metadata is not None:
+            layers.append(metadata._layer)
+            metadata = metadata._parent
+        return reversed(layers)
+
+    def __iter__(self):
+        seen = set()
+        for layer in self._get_layers():
+            for key in layer:
+                if key not in seen:
+                    seen.add(key)
+                    yield key
+
+    def __len__(self):
+        return len(set().union(*self._get_layers()))
+
+    def __repr__(self):
+        return 'Metadata(%r)' % dict(self)
+
+
+FRONT_MATTER_REGEXP = re.compile(
+    r'\A(---|\+\+\+)[ \t]*\r?\n(.*?)^\1[ \t]*(?:\r?\n|\Z)',
+    re.DOTALL | re.MULTILINE)
+
+
+def _parse_simple_front_matter(block):
+    # Return None if a line is not a 'key: value' line: the block is
+    # then not front matter (a reStructuredText title with an
+    # overline, for example).
+    metadata = {}
+    for line in block.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        key, sep, value = line.partition(':')
+        if not sep or not key.strip():
+            return None
+        metadata[key.strip()] = value.strip()
+    return metadata
+
+
+def _get_toml_parser():
+    # TOML front matter is rare and 'tomllib' is slow to import, so it
+    # is imported only when needed.
+    try:
+        import tomllib
+    except ImportError:  # pragma: no coverage
+        try:
+            import tomli as tomllib
+        except ImportError:
+            return None
+    return tomllib
+
+
+def _parse_toml_front_matter(block):
+    tomllib = _get_toml_parser()
+    if tomllib is None:
+        raise ValueError('TOML front matter requires Python 3.11 or the '
+                         '"tomli" package.')
+    return tomllib.loads(block)
+
+
+def read_front_matter(text):
+    """Return a tuple that consists of the metadata found in the
+    front matter of the given ``text`` (if any) and the rest of the
+    text.
+
+    The front matter must start on the very first line. It may be a
+    list of ``key: value`` lines between two ``---`` lines (values are
+    strings) or a TOML document between two ``+++`` lines. If a line
+    between two ``---`` lines is not a ``key: value`` line, there is
+    no front matter: the text may be a reStructuredText document
+    whose title has an overline and an underline made of dashes.
+    """
+    match = FRONT_MATTER_REGEXP.match(text)
+    if match is None:
+        return {}, text
+    delimiter, block = match.groups()
+    if delimiter == '---':
+        metadata = _parse_simple_front_matter(block)
+        if metadata is None:
+            return {}, text
+    else:
+        metadata = _parse_toml_front_matter(block)
+    return metadata, text[match.end():]
+
+
+class _RegexpList(object):
+    # Fallback of 'combine_regexps()' for expressions that cannot be
+    # combined.
+
+    def __init__(self, regexps):
+        self.regexps = regexps
+
+    def match(self, string):
+        for regexp in self.regexps:
+            match = regexp.match(string)
+            if match is not None:
+                return match
+        return None
+
+
+def combine_regexps(regexps):
+    """Return a regular expression that matches a string if any of
+    the given compiled regular expressions matches it (with
+    ``match()``), so that a string is tested only once instead of
+    once per expression.
+
+    Expressions that have different flags cannot be combined, in which
+    case an object with a similar ``match()`` method is returned. The
+    same goes if any expression has groups, since combining expressions
+    would change the numbers of groups and break backreferences (such
+    as ``\\1``).
+    """
+    if not regexps:
+        return re.compile('(?!)')  # never matches
+    flags = set(regexp.flags for regexp in regexps)
+    has_groups = any(regexp.groups for regexp in regexps)
+    if len(flags) == 1 and not has_groups:
+        pattern = '|'.join('(?:%s)' % regexp.pattern for regexp in regexps)
+        try:
+            return re.compile(pattern, flags.pop())
+        except re.error:  # pragma: no cover
+            pass
+    return _RegexpList(regexps)
+
+
+def escape(text):
+    """Escape ``&``, ``<`` and ``>`` in the given ``text``."""
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
 
 
 def hide_index_html_from(path):
@@ -72,36 +423,344 @@ def hide_index_html_from(path):
     return path[:-10].rstrip('/')
 
 
+# 'FICLONE' ioctl request (see 'ioctl_ficlone(2)' on Linux).
+FICLONE = 0x40049409
+ASSET_SYNC_MODES = ('copy', 'hardlink', 'reflink')
+
+
+def _reflink(src, dst):
+    import fcntl  # not available on Windows
+    with open(src, 'rb') as in_file:
+        with open(dst, 'wb') as out_file:
+            fcntl.ioctl(out_file.fileno(), FICLONE, in_file.fileno())
+    shutil.copystat(src, dst)
+
+
+def _copy_file_range(src, dst):
+    # The kernel copies the data (and may share it, on file systems
+    # that support it) without going through user space.
+    with open(src, 'rb') as in_file:
+        with open(dst, 'wb') as out_file:
+            size = os.fstat(in_file.fileno()).st_size
+            while size > 0:
+                copied = os.copy_file_range(in_file.fileno(),
+                                            out_file.fileno(), size)
+                if not copied:
+                    break
+                size -= copied
+    shutil.copystat(src, dst)
+
+
+def sync_file(src, dst, mode='copy'):
+    """Make ``dst`` a copy of ``src`` and return whether their data is
+    shared (i.e. if nothing has been copied).
+
+    ``mode`` may be:
+
+    - ``'copy'``: the file is copied;
+
+    - ``'hardlink'``: ``dst`` is a hard link to ``src``;
+
+    - ``'reflink'``: ``dst`` is a copy-on-write clone of ``src``, on
+      file systems that support it (Btrfs, XFS, etc.).
+
+    If the file cannot be linked or cloned (if ``src`` and ``dst`` are
+    not on the same file system, for example), it is copied.
+    """
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    if mode == 'hardlink':
+        try:
+            os.link(src, dst)
+            return True
+        except OSError:
+            pass
+    elif mode == 'reflink':
+        try:
+            _reflink(src, dst)
+            return True
+        except (ImportError, IOError, OSError):
+            if os.path.lexists(dst):
+                os.unlink(dst)
+        if hasattr(os, 'copy_file_range'):
+            try:
+                _copy_file_range(src, dst)
+                return False
+            except OSError:
+                if os.path.lexists(dst):
+                    os.unlink(dst)
+    shutil.copy2(src, dst)
+    return False
+
+
 class Sitemap(object):
     """A class that can generate Sitemap files.
 
     See `<http://www.sitemaps.org/>`_ for further details about the
     format of the file.
+
+    URLs are kept in memory until there are ``buffer_size`` of them.
+    They are then sorted and written in a temporary file, so that the
+    memory that is used does not depend on the size of the site.
     """
 
-    def __init__(self):
+    def __init__(self, max_urls=SITEMAP_MAX_URLS, buffer_size=10000):
+        self.max_urls = max_urls
+        self.buffer_size = buffer_size
         self.urls = []
+        self._runs = []
+        self._count = 0
+
+    def add(self, path, url, change_freq, priority, mtime=None):
+        """Add a URL to the Sitemap.
+
+        ``mtime`` is the modification time of the file at ``path``. If
+        it is not given, the file is looked up.
+        """
+        if mtime is None:
+            mtime = os.stat(path).st_mtime
+        last_mod = time.strftime('%Y-%m-%d', time.localtime(mtime))
+        self.extend(((url, last_mod, change_freq, str(priority)), ))
+
+    def extend(self, entries):
+        """Add entries, as returned by ``pop_entries()``."""
+        for entry in entries:
+            self.urls.append(entry)
+            self._count += 1
+            if len(self.urls) >= self.buffer_size:
+                self._spill()
+
+    def _spill(self):
+        run = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+        for entry in sorted(self.urls):
+            run.write('\t'.join(entry) + '\n')
+        run.seek(0)
+        self._runs.append(run)
+        self.urls = []
+
+    def _read_run(self, run):
+        run.seek(0)
+        for line in run:
+            yield tuple(line.rstrip('\n').split('\t'))
+
+    def entries(self):
+        """Return an iterator over all entries, sorted by URL."""
+        runs = [self._read_run(run) for run in self._runs]
+        return heapq.merge(sorted(self.urls), *runs)
 
-    def add(self, path, url, change_freq, priority):
-        """Add a URL to the Sitemap."""
-        mtime = time.localtime(os.stat(path).st_mtime)
-        last_mod = time.strftime('%Y-%m-%d', mtime)
-        self.urls.append({'url': url,
-                          'last_mod': last_mod,
-                          'change_freq': change_freq,
-                          'priority': str(priority)})
-
-    def write(self, out):
-        """Write the Sitemap to the given ``out`` stream."""
+    def pop_entries(self):
+        """Return and remove all entries."""
+        entries = list(self.entries())
+        self.reset()
+        return entries
+
+    def reset(self):
+        """Remove all entries."""
+        for run in self._runs:
+            run.close()
+        self._runs = []
+        self.urls = []
+        self._count = 0
+
+    def write(self, out, entries=None):
+        """Write the Sitemap to the given ``out`` stream.
+
+        All entries are written, whatever their number, unless a
+        subset of ``entries`` is given.
+        """
+        if entries is None:
+            entries = self.entries()
         out.write('<?xml version="1.0" encoding="utf-8"?>\n')
-        ns = 'http://www.sitemaps.org/schemas/sitemap/0.9'
-        out.write('<urlset xmlns="%s">' % ns)
-        for url in sorted(self.urls, key=lambda a: a['url']):
+        out.write('<urlset xmlns="%s">' % SITEMAP_NS)
+        for url, last_mod, change_freq, priority in entries:
             out.write('\n'
                       '  <url>\n'
-                      '    <loc>%(url)s</loc>\n'
-                      '    <lastmod>%(last_mod)s</lastmod>\n'
-                      '    <changefreq>%(change_freq)s</changefreq>\n'
-                      '    <priority>%(priority)s</priority>\n'
-                      '  </url>\n' % url)
+                      '    <loc>%s</loc>\n'
+                      '    <lastmod>%s</lastmod>\n'
+                      '    <changefreq>%s</changefreq>\n'
+                      '    <priority>%s</priority>\n'
+                      '  </url>\n' % (escape(url), last_mod,
+                                       change_freq, priority))
         out.write('</urlset>')
+
+    def write_index(self, out, urls):
+        """Write a Sitemap index that refers to the given Sitemap
+        ``urls`` to the given ``out`` stream.
+        """
+        out.write('<?xml version="1.0" encoding="utf-8"?>\n')
+        out.write('<sitemapindex xmlns="%s">' % SITEMAP_NS)
+        for url in urls:
+            out.write('\n'
+                      '  <sitemap>\n'
+                      '    <loc>%s</loc>\n'
+                      '  </sitemap>\n' % escape(url))
+        out.write('</sitemapindex>')
+
+    def save(self, path, base_url, compress=False):
+        """Write the Sitemap in the file at the given ``path``.
+
+        If there are more than ``max_urls`` URLs, they are split into
+        several files (named after ``path``: ``sitemap-1.xml``,
+        ``sitemap-2.xml``, etc.) and a Sitemap index that refers to
+        them is written at ``path``. These files are supposed to be at
+        the root of the site, whose URL is ``base_url``.
+
+        If ``compress`` is set, files are compressed with gzip and a
+        ``.gz`` suffix is appended to their name.
+
+        Return the list of the paths of the files that were written.
+        """
+        if self._count <= self.max_urls:
+            with self._open(path, compress) as out:
+                self.write(out)
+            return [out.name]
+        base, ext = os.path.splitext(path)
+        entries = self.entries()
+        paths = []
+        n_files = (self._count + self.max_urls - 1) // self.max_urls
+        for i in range(1, n_files + 1):
+            with self._open('%s-%d%s' % (base, i, ext), compress) as out:
+                self.write(out, islice(entries, self.max_urls))
+            paths.append(out.name)
+        base_url = base_url.rstrip('/')
+        urls = ['%s/%s' % (base_url, os.path.basename(p)) for p in paths]
+        with self._open(path, compress) as out:
+            self.write_index(out, urls)
+        return [out.name] + paths
+
+    def _open(self, path, compress):
+        if compress:
+            return gzip.open(path + '.gz', 'wt', encoding='utf-8')
+        return io.open(path, 'w', encoding='utf-8')
+
+
+class SitemapStore(object):
+    """A persistent record of the entries of a Sitemap, so that the
+    Sitemap can be patched instead of being generated from scratch.
+
+    ``data`` is a dictionary that is modified in place and is supposed
+    to be stored somewhere between builds (see
+    :class:`soho.manifest.Manifest`).
+
+    Each URL is assigned once and for all to a Sitemap file that holds
+    at most ``max_urls`` URLs. When the Sitemap is saved, only files
+    that contain added, modified or removed entries are written again.
+    """
+
+    def __init__(self, data, max_urls=SITEMAP_MAX_URLS):
+        data.setdefault('split', False)
+        data.setdefault('urls', {})
+        self.data = data
+        self.max_urls = max_urls
+        self._files = {}
+        for url, entry in data['urls'].items():
+            self._files.setdefault(entry[3], set()).add(url)
+        self._dirty = set()
+        self._new_files = False
+        self._writer = Sitemap()
+
+    @property
+    def dirty(self):
+        return bool(self._dirty)
+
+    def urls(self):
+        """Return the set of all URLs."""
+        return set(self.data['urls'])
+
+    def set(self, url, last_mod, change_freq, priority):
+        """Add or update the entry of the given ``url``."""
+        entry = [last_mod, change_freq, str(priority)]
+        current = self.data['urls'].get(url)
+        if current is not None:
+            if current[:3] == entry:
+                return
+            i = current[3]
+        else:
+            i = 1
+            while len(self._files.get(i, ())) >= self.max_urls:
+                i += 1
+            if i not in self._files:
+                self._files[i] = set()
+                self._new_files = True
+            self._files[i].add(url)
+        self.data['urls'][url] = entry + [i]
+        self._dirty.add(i)
+
+    def remove(self, url):
+        """Remove the entry of the given ``url`` (if any)."""
+        entry = self.data['urls'].pop(url, None)
+        if entry is not None:
+            self._files[entry[3]].discard(url)
+            self._dirty.add(entry[3])
+
+    def save(self, path, base_url, compress=False, force=False):
+        """Write Sitemap files that have changed (or all of them if
+        ``force`` is set). See :meth:`Sitemap.save` for details about
+        the arguments.
+
+        Files that have been emptied are dropped from the index. Files
+        that have been written by a previous call but are not part of
+        the Sitemap anymore (because they have been emptied, because
+        the Sitemap is not split anymore or because ``compress`` has
+        changed) are removed.
+
+        Return the list of the paths of the files that were written.
+        """
+        for i in [i for i, urls in self._files.items() if not urls]:
+            del self._files[i]
+            self._new_files = True
+        split = max(self._files or (1, )) > 1
+        if split != self.data['split']:
+            self.data['split'] = split
+            force = True
+        dirty = self._dirty
+        if force:
+            dirty = set(self._files) or set((1, ))
+        write_index = force or self._new_files
+        self._dirty = set()
+        self._new_files = False
+        if split:
+            base, ext = os.path.splitext(path)
+            paths = dict((i, '%s-%d%s' % (base, i, ext)) for i in self._files)
+        else:
+            paths = {1: path}
+        written = []
+        for i in sorted(paths):
+            if i in dirty or not os.path.exists(
+                    self._get_name(paths[i], compress)):
+                written.append(self._write_file(paths[i], i, compress))
+        names = [self._get_name(paths[i], compress) for i in sorted(paths)]
+        if split:
+            index = self._get_name(path, compress)
+            if write_index or not os.path.exists(index):
+                base_url = base_url.rstrip('/')
+                urls = ['%s/%s' % (base_url, os.path.basename(name))
+                        for name in names]
+                with self._writer._open(path, compress) as out:
+                    self._writer.write_index(out, urls)
+                written.insert(0, out.name)
+            names.insert(0, index)
+        self._remove_stale_files(os.path.dirname(path), names)
+        return written
+
+    def _remove_stale_files(self, directory, names):
+        names = sorted(os.path.basename(name) for name in names)
+        for name in set(self.data.get('files', ())).difference(names):
+            try:
+                os.unlink(os.path.join(directory, name))
+            except OSError:
+                pass
+        self.data['files'] = names
+
+    def _write_file(self, path, i, compress):
+        urls = self.data['urls']
+        entries = sorted((url, ) + tuple(urls[url][:3])
+                         for url in self._files.get(i, ()))
+        with self._writer._open(path, compress) as out:
+            self._writer.write(out, entries)
+        return out.name
+
+    def _get_name(self, path, compress):
+        if compress:
+            return path + '.gz'
+        return path
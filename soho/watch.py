@@ -0,0 +1,147 @@
+"""Define the ``Watcher``, which watches source files, assets, templates
+and translations, and asks the builder to process again what is
+affected by a change.
+"""
+
+import os
+import time
+
+# Use inotify (on Linux) if available, so that we do not have to look
+# for changes if nothing happens.
+try:
+    from inotify_simple import flags
+    from inotify_simple import INotify
+except ImportError:  # pragma: no cover
+    INotify = None
+
+
+WATCH_FLAGS = None
+if INotify is not None:  # pragma: no cover
+    WATCH_FLAGS = (flags.CREATE | flags.DELETE | flags.MODIFY |
+                   flags.MOVED_FROM | flags.MOVED_TO | flags.ATTRIB)
+
+
+def get_snapshot(dirs):
+    """Return a mapping of the path of each file in the given
+    directories to its modification time and size.
+    """
+    snapshot = {}
+    for dir_path in dirs:
+        for parent, _, filenames in os.walk(dir_path):
+            for filename in filenames:
+                path = os.path.join(parent, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:  # file has just been removed
+                    continue
+                snapshot[path] = (stat.st_mtime, stat.st_size)
+    return snapshot
+
+
+def get_changes(old, new):
+    """Return the sorted list of paths that have been added, modified
+    or removed between the ``old`` and the ``new`` snapshots.
+    """
+    changes = set(old) ^ set(new)
+    changes.update(path for path, signature in new.items()
+                   if path in old and old[path] != signature)
+    return sorted(changes)
+
+
+class Watcher(object):
+    """Watch the given directories and call ``builder.rebuild()``
+    with the list of changed files.
+
+    If the ``inotify_simple`` package is installed, the watcher sleeps
+    until the kernel notifies a change, and changed files are known
+    from the notifications. Otherwise, it walks the directories every
+    ``interval`` seconds and compares the modification time and the
+    size of each file with the previous walk.
+    """
+
+    def __init__(self, builder, dirs, interval=0.5):
+        self.builder = builder
+        self.dirs = [d for d in dirs if d]
+        self.interval = interval
+        self._inotify = None
+        self._snapshot = None
+        self._watches = {}
+        if INotify is None:
+            self._snapshot = get_snapshot(self.dirs)
+        else:
+            self._inotify = INotify()
+            for dir_path in self.dirs:
+                self._add_watches(dir_path)
+
+    def run(self):  # pragma: no coverage
+        """Watch until interrupted."""
+        self.builder.logger.info('Watching for changes (press Ctrl-C to '
+                                 'stop)...')
+        try:
+            while True:
+                if self._inotify is None:
+                    time.sleep(self.interval)
+                self.check(wait=True)
+        except KeyboardInterrupt:
+            self.builder.logger.info('Stopped watching.')
+
+    def check(self, wait=False):
+        """Look for changes and rebuild what is affected. Return the
+        list of changed files.
+
+        With ``inotify_simple``, if ``wait`` is set, wait until a
+        change is notified.
+        """
+        if self._inotify is None:
+            snapshot = get_snapshot(self.dirs)
+            changes = get_changes(self._snapshot, snapshot)
+            self._snapshot = snapshot
+        else:
+            changes = self._read_changes(wait)
+        if changes:
+            start = time.time()
+            self.builder.rebuild(changes)
+            self.builder.logger.info('Rebuilt in %.3f seconds.',
+                                     time.time() - start)
+        return changes
+
+    def _read_changes(self, wait):
+        events = self._inotify.read(timeout=None if wait else 0)
+        if events and wait:
+            # Leave a bit of time to editors that write files in
+            # several steps.
+            time.sleep(0.05)
+            events.extend(self._inotify.read(timeout=0))
+        changes = set()
+        for event in events:
+            if event.mask & flags.IGNORED:
+                # The directory has been removed (or is not watched
+                # anymore).
+                self._watches.pop(event.wd, None)
+                continue
+            dir_path = self._watches.get(event.wd)
+            if dir_path is None or not event.name:
+                continue
+            path = os.path.join(dir_path, event.name)
+            if not event.mask & flags.ISDIR:
+                changes.add(path)
+            elif event.mask & (flags.CREATE | flags.MOVED_TO):
+                # Files may have been added to the new directory before
+                # it is watched.
+                changes.update(self._add_watches(path))
+        return sorted(changes)
+
+    def _add_watches(self, dir_path):
+        """Watch the given directory and its subdirectories. Return the
+        paths of the files that they contain.
+        """
+        paths = []
+        for parent, _, filenames in os.walk(dir_path):
+            try:
+                wd = self._inotify.add_watch(parent, WATCH_FLAGS)
+            except OSError:  # directory has just been removed
+                continue
+            self._watches[wd] = parent
+            paths.extend(os.path.join(parent, filename)
+                         for filename in filenames)
+        return paths
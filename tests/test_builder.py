@@ -1,5 +1,6 @@
 from contextlib import contextmanager
 from filecmp import dircmp
+import logging
 from tempfile import mkdtemp
 from shutil import rmtree
 from unittest import TestCase
@@ -16,6 +17,8 @@ def temp_folder():
 class DummyLogger(object):
     def info(self, *args, **kwargs): pass
     debug = warning = info
+    def log(self, level, msg, *args):
+        getattr(self, logging.getLevelName(level).lower())(msg, *args)
 
 
 class BuilderFunctionalTest(object):
@@ -41,7 +44,8 @@ class BuilderFunctionalTest(object):
         return Builder(**settings)
 
     def assertBuilderOutput(self, out_dir, expected_dir):
-        diff = dircmp(out_dir, expected_dir)
+        from soho.defaults import DEFAULT_MANIFEST
+        diff = dircmp(out_dir, expected_dir, ignore=[DEFAULT_MANIFEST])
         self.assertEqual(diff.left_only, [])
         self.assertEqual(diff.right_only, [])
         self.assertEqual(diff.diff_files, [])
@@ -85,6 +89,15 @@ class BuilderFunctionalTest(object):
             self._build(builder, out_dir)
             self.assertBuilderOutput(out_dir, self.expected_dir)
 
+    def test_builder_parallel(self):
+        from .base import make_options
+        options = make_options(config_file=self.config_file)
+        with temp_folder() as out_dir:
+            builder = self._make_builder(options=options, out_dir=out_dir,
+                                         jobs=2)
+            self._build(builder, out_dir)
+            self.assertBuilderOutput(out_dir, self.expected_dir)
+
 
 class TestSite1(BuilderFunctionalTest, TestCase):
 
@@ -140,3 +153,630 @@ class TestTutorialMetadata(TutorialFunctionalTest, TestCase):
 
 class TestTutorialI18n(TutorialFunctionalTest, TestCase):
     test_site = '4-i18n'
+
+
+class RecordingLogger(DummyLogger):
+    def __init__(self):
+        self.messages = []
+    def info(self, msg, *args):
+        self.messages.append(msg % args)
+
+
+class SiteFixture(object):
+    """Copy the site of the third step of the tutorial to a temporary
+    directory and build it. ``custom_settings`` override the settings
+    of the site.
+    """
+
+    custom_settings = {}
+
+    def setUp(self):
+        import os
+        import shutil
+        here = os.path.dirname(__file__)
+        site_dir = os.path.join(here, '..', 'docs', '_tutorial', '3-metadata')
+        self.tmp_dir = mkdtemp()
+        self.site_dir = os.path.join(self.tmp_dir, 'site')
+        shutil.copytree(site_dir, self.site_dir)
+        self.out_dir = os.path.join(self.tmp_dir, 'out')
+        os.mkdir(self.out_dir)
+        self._build()
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def _make_builder(self, **custom_settings):
+        import os
+        from soho.builder import Builder
+        from soho.cli import get_settings
+        from .base import make_options
+        config_file = os.path.join(self.site_dir, 'sohoconf.py')
+        settings = get_settings(make_options(config_file=config_file))
+        settings.update(self.custom_settings)
+        settings.update(logger=DummyLogger(), out_dir=self.out_dir)
+        settings.update(custom_settings)
+        return Builder(**settings)
+
+    def _build(self):
+        import os
+        logger = RecordingLogger()
+        self._make_builder(logger=logger).build()
+        self.messages = logger.messages
+        return sorted(os.path.basename(msg.split('"')[1])
+                      for msg in logger.messages
+                      if msg.startswith(('Processing', 'Copying "')))
+
+    def _append_to(self, *path):
+        import os
+        with open(os.path.join(self.site_dir, *path), 'a') as fp:
+            fp.write('\n')
+
+    def _read(self, *path):
+        import os
+        with open(os.path.join(self.out_dir, *path)) as fp:
+            return fp.read()
+
+    def _read_sitemap(self):
+        return self._read('sitemap.xml')
+
+
+class TestRendererCache(SiteFixture, TestCase):
+
+    def setUp(self):
+        import os
+        import shutil
+        SiteFixture.setUp(self)
+        here = os.path.dirname(__file__)
+        self.template_path = os.path.join(self.site_dir, 'templates',
+                                          'test.pt')
+        shutil.copy(os.path.join(here, 'fixtures', 'test.pt'),
+                    self.template_path)
+
+    def test_template_is_compiled_once(self):
+        builder = self._make_builder()
+        renderer = builder.get_renderer(self.template_path)
+        self.assertIs(builder.get_renderer(self.template_path), renderer)
+        self.assertEqual(builder._renderer_misses, 1)
+        self.assertEqual(builder._renderer_hits, 1)
+
+    def test_modified_template_is_reloaded(self):
+        import os
+        import mock
+        builder = self._make_builder()
+        renderer = builder.get_renderer(self.template_path)
+        mtime = os.stat(self.template_path).st_mtime
+        os.utime(self.template_path, (mtime + 10, mtime + 10))
+        with mock.patch.object(renderer, 'teardown') as teardown:
+            self.assertIsNot(builder.get_renderer(self.template_path),
+                             renderer)
+        teardown.assert_called_once_with()
+        self.assertEqual(builder._renderer_misses, 2)
+        self.assertEqual(builder._renderer_hits, 0)
+
+
+class TestIncrementalBuild(SiteFixture, TestCase):
+
+    def test_nothing_changed(self):
+        self.assertEqual(self._build(), [])
+
+    def test_template_changed(self):
+        self._append_to('templates', 'layout.pt')
+        self.assertEqual(self._build(), ['index.rst', 'second.html'])
+
+    def test_file_metadata_changed(self):
+        self._append_to('src', 'second.html.meta.py')
+        self.assertEqual(self._build(), ['second.html'])
+
+    def test_dir_metadata_added(self):
+        self._append_to('src', '.meta.py')
+        self.assertEqual(self._build(), ['index.rst', 'second.html'])
+
+    def test_sitemap_is_not_written_if_nothing_changed(self):
+        self._build()
+        self.assertNotIn('Updated Sitemap (1 file(s) written).',
+                         self.messages)
+
+    def test_sitemap_is_patched(self):
+        import os
+        index_url = '<loc>http://exemple.com/soho/default-base-url/</loc>'
+        self.assertIn(index_url, self._read_sitemap())
+        os.unlink(os.path.join(self.site_dir, 'src', 'index.rst'))
+        self._build()
+        self.assertIn('Updated Sitemap (1 file(s) written).', self.messages)
+        self.assertNotIn(index_url, self._read_sitemap())
+        self.assertIn('second.html</loc>', self._read_sitemap())
+
+    def test_no_manifest(self):
+        import os
+        os.unlink(os.path.join(self.out_dir, '.soho-manifest.json'))
+        # Assets are not copied again, since their copies have the
+        # same size and modification time.
+        self.assertEqual(self._build(), ['index.rst', 'second.html'])
+
+
+class RecordingGenerator(object):
+    log = []
+    def __init__(self):
+        self.log.append('init')
+    def setup(self, cache_dir=None):
+        self.log.append('setup')
+    def teardown(self):
+        self.log.append('teardown')
+    def generate(self, path):
+        self.log.append('generate')
+        return {'title': 'Title'}, '<p>Body</p>'
+
+
+class TestGeneratorLifecycle(SiteFixture, TestCase):
+
+    def setUp(self):
+        import os
+        import mock
+        patcher = mock.patch.dict('soho.generators.registry',
+                                  {'rec': RecordingGenerator})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        RecordingGenerator.log = []
+        SiteFixture.setUp(self)
+        for filename in ('a.rec', 'b.rec'):
+            with open(os.path.join(self.site_dir, 'src', filename), 'w'):
+                pass
+
+    def test_one_generator_per_build(self):
+        RecordingGenerator.log = []
+        self.assertEqual(self._build(), ['a.rec', 'b.rec'])
+        self.assertEqual(RecordingGenerator.log,
+                         ['init', 'setup', 'generate', 'generate',
+                          'teardown'])
+        RecordingGenerator.log = []
+        self._append_to('src', 'a.rec')
+        self.assertEqual(self._build(), ['a.rec'])
+        self.assertEqual(RecordingGenerator.log,
+                         ['init', 'setup', 'generate', 'teardown'])
+
+    def test_generator_is_torn_down_on_error(self):
+        import os
+        import mock
+        self._append_to('src', 'a.rec')
+        with mock.patch.object(RecordingGenerator, 'generate',
+                               side_effect=ValueError):
+            RecordingGenerator.log = []
+            self.assertRaises(ValueError, self._build)
+            self.assertEqual(RecordingGenerator.log,
+                             ['init', 'setup', 'teardown'])
+            RecordingGenerator.log = []
+            builder = self._make_builder()
+            self.assertRaises(ValueError, builder.rebuild,
+                              [os.path.join(self.site_dir, 'src', 'a.rec')])
+            self.assertEqual(RecordingGenerator.log,
+                             ['init', 'setup', 'teardown'])
+
+
+class TestCacheDir(SiteFixture, TestCase):
+
+    def test_builders_have_their_own_cache_dir(self):
+        import os
+        cache_dir_1 = os.path.join(self.tmp_dir, 'cache1')
+        cache_dir_2 = os.path.join(self.tmp_dir, 'cache2')
+        builder = self._make_builder(cache_dir=cache_dir_1, force=True)
+        self._make_builder(cache_dir=cache_dir_2, force=True)
+        builder.build()
+        self.assertEqual(sorted(os.listdir(cache_dir_1)),
+                         ['fragments', 'metadata', 'templates'])
+        self.assertFalse(os.path.exists(cache_dir_2))
+
+
+class TestSystemCalls(SiteFixture, TestCase):
+
+    def _count_stat_calls(self):
+        import collections
+        import os
+        import mock
+        calls = collections.Counter()
+        stat = os.stat
+        def counting_stat(path, *args, **kwargs):
+            calls[str(path)] += 1
+            return stat(path, *args, **kwargs)
+        with mock.patch('os.stat', counting_stat):
+            self._build()
+        return calls
+
+    def test_stat_calls_when_nothing_changed(self):
+        import os
+        calls = self._count_stat_calls()
+        # Source files and assets are stat'ed by 'os.scandir()' only.
+        for dir_name in ('src', 'assets'):
+            for dir_path, _, filenames in os.walk(
+                    os.path.join(self.site_dir, dir_name)):
+                for filename in filenames:
+                    if filename.endswith('.meta.py'):
+                        continue
+                    path = os.path.join(dir_path, filename)
+                    self.assertEqual(calls[path], 0, path)
+        # Generated files are stat'ed once.
+        for filename in ('index.html', 'second.html', 'css/style.css'):
+            path = os.path.join(self.out_dir, *filename.split('/'))
+            self.assertEqual(calls[path], 1, path)
+
+
+class TestIgnoredDirectories(SiteFixture, TestCase):
+
+    @property
+    def custom_settings(self):
+        import re
+        patterns = ('.*~$', 'drafts/', '.*/tmp$')
+        return {'ignore_files': [re.compile(p) for p in patterns]}
+
+    def test_ignore_file(self):
+        builder = self._make_builder()
+        self.assertTrue(builder.ignore_file('index.rst~'))
+        self.assertTrue(builder.ignore_file('drafts', is_dir=True))
+        self.assertFalse(builder.ignore_file('drafts'))
+        self.assertTrue(builder.ignore_file('foo/tmp', is_dir=True))
+        self.assertFalse(builder.ignore_file('foo/tmp.html'))
+        self.assertTrue(builder.ignore_file('.meta.py'))
+        self.assertTrue(builder.ignore_path('drafts/sub/foo.rst'))
+        self.assertFalse(builder.ignore_path('sub/drafts.rst'))
+
+    def test_ignored_directories_are_not_walked(self):
+        import os
+        import mock
+        drafts_dir = os.path.join(self.site_dir, 'src', 'drafts')
+        os.mkdir(drafts_dir)
+        with open(os.path.join(drafts_dir, 'draft.html'), 'w'):
+            pass
+        scandir = os.scandir
+        with mock.patch('os.scandir', side_effect=scandir) as mock_scandir:
+            self.assertEqual(self._build(), [])
+        walked = [call[0][0] for call in mock_scandir.call_args_list]
+        self.assertNotIn(drafts_dir, walked)
+        self.assertFalse(os.path.exists(os.path.join(self.out_dir, 'drafts')))
+
+
+class TestParallelBuild(SiteFixture, TestCase):
+
+    def test_messages_are_logged_in_order(self):
+        def get_messages():
+            # Each worker has its own template cache.
+            return [msg for msg in self.messages
+                    if not msg.startswith('Template cache')]
+        self.custom_settings = {'force': True}
+        self._build()
+        expected = get_messages()
+        self.custom_settings = {'force': True, 'jobs': 2}
+        self._build()
+        self.assertEqual(get_messages(), expected)
+
+    def test_worker_error(self):
+        import os
+        with open(os.path.join(self.site_dir, 'templates', 'layout.pt'),
+                  'w') as fp:
+            fp.write('<p>${undefined_name}</p>')
+        self.custom_settings = {'force': True, 'jobs': 2}
+        with self.assertRaises(RuntimeError) as context:
+            self._build()
+        message = str(context.exception)
+        # Any source file may fail first.
+        self.assertTrue(message.startswith(
+            'Could not process "%s' % os.path.join(self.site_dir, 'src')))
+        self.assertIn('NameError: undefined_name', message)
+
+    def test_worker_logger(self):
+        from soho.builder import WorkerLogger
+        logger = WorkerLogger()
+        logger.debug('debug %s', 1)
+        logger.info('info')
+        logger.warning('warning')
+        logger.error('error')
+        self.assertEqual(logger.pop_records(),
+                         [(logging.DEBUG, 'debug %s', (1, )),
+                          (logging.INFO, 'info', ()),
+                          (logging.WARNING, 'warning', ()),
+                          (logging.ERROR, 'error', ())])
+        self.assertEqual(logger.pop_records(), [])
+
+
+class TestRebuild(SiteFixture, TestCase):
+
+    def setUp(self):
+        SiteFixture.setUp(self)
+        self.logger = RecordingLogger()
+        self.builder = self._make_builder(logger=self.logger)
+
+    def _rebuild(self, *paths):
+        import os
+        paths = [os.path.join(self.site_dir, *path) for path in paths]
+        self.logger.messages = []
+        self.builder.rebuild(paths)
+        return sorted(os.path.basename(msg.split('"')[1])
+                      for msg in self.logger.messages
+                      if msg.startswith(('Processing', 'Copying "')))
+
+    def test_rebuild_source(self):
+        self._append_to('src', 'index.rst')
+        self.assertEqual(self._rebuild(('src', 'index.rst')), ['index.rst'])
+
+    def test_rebuild_new_source(self):
+        import os
+        os.mkdir(os.path.join(self.site_dir, 'src', 'new'))
+        self._append_to('src', 'new', 'new.html')
+        with open(os.path.join(self.site_dir, 'src', 'new', '.meta.py'),
+                  'w') as fp:
+            fp.write('title = "New"')
+        self.assertEqual(self._rebuild(('src', 'new', 'new.html')),
+                         ['new.html'])
+        self.assertTrue(os.path.exists(
+            os.path.join(self.out_dir, 'new', 'new.html')))
+
+    def test_rebuild_removed_source(self):
+        import os
+        os.unlink(os.path.join(self.site_dir, 'src', 'index.rst'))
+        self.assertEqual(self._rebuild(('src', 'index.rst')), [])
+
+    def test_rebuild_template(self):
+        self._append_to('templates', 'layout.pt')
+        self.assertEqual(self._rebuild(('templates', 'layout.pt')),
+                         ['index.rst', 'second.html'])
+
+    def test_rebuild_metadata(self):
+        self._append_to('src', 'second.html.meta.py')
+        self.assertEqual(self._rebuild(('src', 'second.html.meta.py')),
+                         ['second.html'])
+
+    def test_rebuild_asset(self):
+        self._append_to('assets', 'css', 'style.css')
+        self.assertEqual(self._rebuild(('assets', 'css', 'style.css')),
+                         ['style.css'])
+
+    def test_sitemap_without_manifest(self):
+        import os
+        self.builder = self._make_builder(logger=self.logger, manifest=None)
+        sitemap_path = os.path.join(self.out_dir, 'sitemap.xml')
+        with open(sitemap_path) as fp:
+            sitemap = fp.read()
+        self.assertIn('second.html', sitemap)
+        self._append_to('src', 'index.rst')
+        self.assertEqual(self._rebuild(('src', 'index.rst')), ['index.rst'])
+        # The Sitemap is not truncated to the rebuilt file.
+        with open(sitemap_path) as fp:
+            self.assertEqual(fp.read(), sitemap)
+
+
+class TestHashChangeDetection(TestIncrementalBuild):
+
+    # Inherits all tests of incremental builds, which must give the
+    # same results with both change detections.
+    custom_settings = {'change_detection': 'hash'}
+
+    def test_touched_files_are_ignored(self):
+        import os
+        import time
+        future = time.time() + 3600
+        for dir_path, _, filenames in os.walk(self.site_dir):
+            for filename in filenames:
+                os.utime(os.path.join(dir_path, filename), (future, future))
+        self.assertEqual(self._build(), [])
+
+    def test_source_changed(self):
+        self._append_to('assets', 'css', 'style.css')
+        self._append_to('src', 'index.rst')
+        self.assertEqual(self._build(), ['index.rst', 'style.css'])
+
+
+class TestHardlinkAssets(SiteFixture, TestCase):
+
+    custom_settings = {'asset_sync': 'hardlink'}
+
+    def test_assets_are_linked(self):
+        import os
+        in_path = os.path.join(self.site_dir, 'assets', 'css', 'style.css')
+        out_path = os.path.join(self.out_dir, 'css', 'style.css')
+        os.unlink(out_path)
+        self.assertEqual(self._build(), ['style.css'])
+        self.assertTrue(os.path.samefile(in_path, out_path))
+        size = os.stat(in_path).st_size
+        self.assertIn('Assets: 0 byte(s) copied, %d byte(s) linked.' % size,
+                      self.messages)
+
+
+class TestParallelAssets(SiteFixture, TestCase):
+
+    custom_settings = {'asset_jobs': 4}
+
+    def test_copies_are_logged_in_order(self):
+        import os
+        assets_dir = os.path.join(self.site_dir, 'assets', 'many')
+        os.mkdir(assets_dir)
+        for i in range(50):
+            with open(os.path.join(assets_dir, '%d.txt' % i), 'w') as fp:
+                fp.write(str(i))
+        self.custom_settings = {'asset_jobs': 1, 'force': True}
+        self._build()
+        serial = self.messages
+        self.custom_settings = {'asset_jobs': 4, 'force': True}
+        self._build()
+        self.assertEqual(self.messages, serial)
+        self.assertTrue(os.path.exists(
+            os.path.join(self.out_dir, 'many', '49.txt')))
+
+
+class TestPrune(SiteFixture, TestCase):
+
+    custom_settings = {'prune': True}
+
+    def _exists(self, *path):
+        import os
+        return os.path.exists(os.path.join(self.out_dir, *path))
+
+    def test_removed_source(self):
+        import os
+        os.unlink(os.path.join(self.site_dir, 'src', 'second.html'))
+        self.assertEqual(self._build(), [])
+        self.assertFalse(self._exists('second.html'))
+        self.assertTrue(self._exists('index.html'))
+        self.assertNotIn('second.html', self._read_sitemap())
+        # Nothing is left to remove.
+        self._build()
+        self.assertFalse([msg for msg in self.messages
+                          if msg.startswith('Removing')])
+
+    def test_removed_asset_dir(self):
+        import os
+        import shutil
+        shutil.rmtree(os.path.join(self.site_dir, 'assets', 'css'))
+        self._build()
+        self.assertFalse(self._exists('css'))
+
+    def test_assets_only(self):
+        import os
+        os.unlink(os.path.join(self.site_dir, 'src', 'second.html'))
+        self.custom_settings = {'prune': True, 'assets_only': True}
+        self._build()
+        self.assertTrue(self._exists('second.html'))
+        self.custom_settings = {'prune': True}
+        self._build()
+        self.assertFalse(self._exists('second.html'))
+
+    def test_dry_run(self):
+        import os
+        os.unlink(os.path.join(self.site_dir, 'src', 'second.html'))
+        self.custom_settings = {'prune': True, 'do_nothing': True}
+        self._build()
+        self.assertTrue(self._exists('second.html'))
+        self.assertIn('Removing "%s".' % os.path.join(self.out_dir,
+                                                       'second.html'),
+                      self.messages)
+
+
+class TestLocales(SiteFixture, TestCase):
+
+    custom_settings = {'locales': ['en', 'fr']}
+
+    def setUp(self):
+        import os
+        import shutil
+        here = os.path.dirname(__file__)
+        SiteFixture.setUp(self)
+        # Show the bindings that depend on the locale.
+        with open(os.path.join(self.site_dir, 'templates', 'layout.pt'),
+                  'w') as fp:
+            fp.write('<p>${md.locale} ${md.path} ${md.title}</p>')
+        locale_dir = os.path.join(self.site_dir, 'locale')
+        shutil.copytree(os.path.join(here, 'fixtures', 'site1', 'locale'),
+                        locale_dir)
+        self.custom_settings = dict(self.custom_settings,
+                                    locale_dir=locale_dir)
+        self._build()
+
+    def test_outputs(self):
+        import os
+        self.assertEqual(self._read('en', 'index.html'),
+                         '<p>en /en/ The home page</p>')
+        self.assertEqual(self._read('fr', 'second.html'),
+                         '<p>fr /fr/second.html The second page</p>')
+        self.assertFalse(os.path.exists(os.path.join(self.out_dir,
+                                                     'index.html')))
+        # Assets are not localized.
+        self.assertTrue(os.path.exists(os.path.join(self.out_dir, 'css',
+                                                    'style.css')))
+        self.assertFalse(os.path.exists(os.path.join(self.out_dir, 'fr',
+                                                     'css')))
+        sitemap = self._read('sitemap.xml')
+        self.assertIn('/default-base-url/en/</loc>', sitemap)
+        self.assertIn('/default-base-url/fr/second.html</loc>', sitemap)
+
+    def test_converted_once(self):
+        import mock
+        from soho.generators import rst
+        convert = rst.convert
+        with mock.patch('soho.generators.rst.convert',
+                        side_effect=convert) as mock_convert:
+            self.custom_settings = dict(self.custom_settings, force=True)
+            self.assertEqual(self._build(), ['index.rst', 'index.rst',
+                                             'second.html', 'second.html',
+                                             'style.css'])
+        self.assertEqual(mock_convert.call_count, 1)
+
+    def test_catalog_changed(self):
+        import os
+        self.assertEqual(self._build(), [])
+        with open(os.path.join(self.site_dir, 'locale', 'fr', 'LC_MESSAGES',
+                               'test.mo'), 'ab') as fp:
+            fp.write(b'\0')
+        self.assertEqual(self._build(), ['index.rst', 'second.html'])
+        self.assertTrue(all(os.sep + 'fr' + os.sep in msg
+                            for msg in self.messages
+                            if msg.startswith('Processing')))
+
+    def test_find_sources(self):
+        import os
+        builder = self._make_builder()
+        src_dir = os.path.join(self.site_dir, 'src')
+        self.assertEqual(builder.find_sources('/fr/'),
+                         [os.path.join(src_dir, 'index.rst')])
+        self.assertEqual(builder.find_sources('/en/second.html'),
+                         [os.path.join(src_dir, 'second.html')])
+        self.assertEqual(builder.find_sources('/fr/css/style.css'), [])
+
+
+class TestTemplateSelection(SiteFixture, TestCase):
+
+    def setUp(self):
+        import os
+        SiteFixture.setUp(self)
+        # 'second.html' uses 'page.pt', which uses a macro of
+        # 'macros/main.pt'.
+        template_dir = os.path.join(self.site_dir, 'templates')
+        os.mkdir(os.path.join(template_dir, 'macros'))
+        with open(os.path.join(template_dir, 'macros', 'main.pt'), 'w') as fp:
+            fp.write('<p metal:define-macro="main">Macro</p>')
+        with open(os.path.join(template_dir, 'page.pt'), 'w') as fp:
+            fp.write('<div>${md.title} '
+                     '<p metal:use-macro="load: macros/main.pt"/></div>')
+        with open(os.path.join(self.site_dir, 'src', 'second.html.meta.py'),
+                  'a') as fp:
+            fp.write("template = 'page.pt'\n")
+        self._build()
+
+    def test_template_from_metadata(self):
+        self.assertEqual(self._read('second.html'),
+                         '<div>The second page <p>Macro</p></div>')
+        self.assertIn('Generated by Soho.', self._read('index.html'))
+        # Each template is compiled once.
+        self.custom_settings = {'force': True}
+        self._build()
+        self.assertIn('Template cache: 0 hit(s), 2 miss(es).',
+                      self.messages)
+
+    def test_nothing_changed(self):
+        self.assertEqual(self._build(), [])
+
+    def test_default_template_changed(self):
+        self._append_to('templates', 'layout.pt')
+        self.assertEqual(self._build(), ['index.rst'])
+
+    def test_template_changed(self):
+        self._append_to('templates', 'page.pt')
+        self.assertEqual(self._build(), ['second.html'])
+
+    def test_macro_changed(self):
+        import os
+        path = os.path.join(self.site_dir, 'templates', 'macros', 'main.pt')
+        with open(path, 'w') as fp:
+            fp.write('<p metal:define-macro="main">Modified</p>')
+        self.assertEqual(self._build(), ['second.html'])
+        self.assertEqual(self._read('second.html'),
+                         '<div>The second page <p>Modified</p></div>')
+
+    def test_renderer_is_discarded_if_macro_changed(self):
+        import os
+        builder = self._make_builder()
+        template_path = os.path.join(self.site_dir, 'templates', 'page.pt')
+        macro_path = os.path.join(self.site_dir, 'templates', 'macros',
+                                  'main.pt')
+        renderer = builder.get_renderer(template_path)
+        self.assertEqual(renderer.get_dependencies(), [macro_path])
+        self.assertIs(builder.get_renderer(template_path), renderer)
+        mtime = os.stat(macro_path).st_mtime
+        os.utime(macro_path, (mtime + 10, mtime + 10))
+        self.assertIsNot(builder.get_renderer(template_path), renderer)
@@ -24,15 +24,24 @@ class TestGetSettings(TestCase):
         self.assertIsInstance(logger, Logger)
         self.assertEqual(settings,
                          {'asset_dir': path('assets'),
+                          'asset_jobs': 1,
+                          'asset_sync': 'copy',
                           'assets_only': False,
                           'base_url': 'http://exemple.com',
+                          'cache_dir': None,
+                          'change_detection': 'mtime',
                           'do_nothing': False,
                           'force': False,
                           'hide_index_html': True,
                           'ignore_files': ignore_files,
+                          'jobs': 1,
                           'locale_dir': path('locale'),
+                          'locales': None,
+                          'manifest': '.soho-manifest.json',
                           'out_dir': path('www'),
+                          'prune': False,
                           'sitemap': 'sitemap.xml',
+                          'sitemap_gzip': False,
                           'src_dir': path('src'),
                           'template': 'layout.pt',
                           'template_dir': path('templates'),
@@ -33,5 +33,5 @@ class TestRegisterGenerator(TestCase):
     def test_basics(self, mock_registry):
         from soho.generators import registry
         self._call_fut('unittest.TestCase', 'html', 'foo')
-        self.assertEqual(registry['html'], TestCase)
-        self.assertEqual(registry['foo'], TestCase)
+        self.assertEqual(registry['html'], 'unittest.TestCase')
+        self.assertEqual(registry['foo'], 'unittest.TestCase')
@@ -24,3 +24,20 @@ class TestHTMLGenerator(TestCase):
         meta, html = generator.generate(path)
         self.assertEqual(meta, {'foo': 'Value of foo'})
         self.assertEqual(html, '<p>This is another test.</p>')
+
+    def test_with_front_matter(self):
+        import os.path
+        generator = self._make_one()
+        here = os.path.dirname(__file__)
+        path = os.path.join(here, 'fixtures', 'test4.html')
+        meta, html = generator.generate(path)
+        self.assertEqual(meta, {'foo': 'Value of foo', 'bar': 'Value of bar'})
+        self.assertEqual(html, '<p>This is a test with front matter.</p>')
+
+    def test_read_metadata(self):
+        import os.path
+        generator = self._make_one()
+        here = os.path.dirname(__file__)
+        path = os.path.join(here, 'fixtures', 'test4.html')
+        self.assertEqual(generator.read_metadata(path),
+                         {'foo': 'Value of foo', 'bar': 'Value of bar'})
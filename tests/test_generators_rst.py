@@ -7,9 +7,10 @@ class TestRSTGenerator(TestCase):
         from soho.generators.rst import RSTGenerator
         return RSTGenerator()
 
-    def _call_generate(self, filename):
+    def _call_generate(self, filename, cache_dir=None):
         import os.path
         generator = self._make_one()
+        generator.setup(cache_dir=cache_dir)
         here = os.path.dirname(__file__)
         path = os.path.join(here, 'fixtures', filename)
         return generator.generate(path)
@@ -30,6 +31,72 @@ class TestRSTGenerator(TestCase):
                                 'bar': 'Overriden value of bar'})
         self.assertEqual(html, '<p>This is another <strong>test</strong>.</p>')
 
+    def test_with_front_matter(self):
+        meta, html = self._call_generate('test4.rst')
+        self.assertEqual(meta, {'foo': 'Value of foo',
+                                'bar': 'Overriden value of bar'})
+        self.assertEqual(html,
+                         '<p>This is a <strong>test</strong> with front '
+                         'matter.</p>')
+
+    def test_overlined_title_is_not_front_matter(self):
+        meta, html = self._call_generate('test5.rst')
+        self.assertEqual(meta, {})
+        self.assertEqual(html,
+                         '<p>This is a document with an overlined title.</p>')
+
+    def test_publisher_is_reused(self):
+        from soho.generators import rst
+        self._call_generate('test1.rst')
+        publisher = rst.publisher._publisher
+        meta, html = self._call_generate('test2.rst')
+        self.assertIs(rst.publisher._publisher, publisher)
+        self.assertEqual(meta, {'foo': 'Value of foo'})
+        self.assertEqual(html, '<p>This is another <strong>test</strong>.</p>')
+        # Each document has its own settings.
+        self.assertIsNot(publisher.writer.document.settings,
+                         publisher.settings)
+
+    def test_cache(self):
+        import os
+        import mock
+        from .test_builder import temp_folder
+        with temp_folder() as cache_dir:
+            generated = self._call_generate('test2.rst', cache_dir)
+            fragments_dir = os.path.join(cache_dir, 'fragments')
+            self.assertEqual(len(os.listdir(fragments_dir)), 1)
+            with mock.patch('soho.generators.rst.publisher') as publisher:
+                cached = self._call_generate('test2.rst', cache_dir)
+            self.assertFalse(publisher.publish_parts.called)
+            self.assertEqual(cached, generated)
+            self.assertEqual(cached[0], {'foo': 'Value of foo'})
+
+    def test_cache_is_not_used_if_file_includes_other_files(self):
+        import os
+        import mock
+        from soho.generators import rst
+        from .test_builder import temp_folder
+        publish_parts = rst.publisher.publish_parts
+        def fake_publish_parts(source):
+            return publish_parts(source)[0], ['/path/to/included.rst']
+        with temp_folder() as cache_dir:
+            with mock.patch.object(rst.publisher, 'publish_parts',
+                                   fake_publish_parts):
+                self._call_generate('test1.rst', cache_dir)
+            self.assertFalse(
+                os.path.exists(os.path.join(cache_dir, 'fragments')))
+
+    def test_cache_key_includes_versions(self):
+        import json
+        import docutils
+        import soho
+        from soho.generators.rst import CACHE_KEY_PREFIX
+        from soho.generators.rst import PYGMENTS_VERSION
+        prefix = json.loads(CACHE_KEY_PREFIX)
+        self.assertIn(docutils.__version__, prefix)
+        self.assertIn(PYGMENTS_VERSION, prefix)
+        self.assertIn(soho.__version__, prefix)
+
     def test_sphinx_directives(self):
         meta, html = self._call_generate('test-code-block.rst')
         expected = (
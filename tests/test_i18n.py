@@ -50,3 +50,181 @@ class TestTranslatorWrapper(TestCase):
             ('fr', 'Web site', 'unknown', {}, 'Web site')):
             translated = wrapper.translate(locale, msgid, domain, mapping)
             self.assertEqual(translated, expected)
+
+    def test_memo(self):
+        import os
+        here = os.path.dirname(__file__)
+        locale_dir = os.path.join(here, 'fixtures', 'site1', 'locale')
+        wrapper = self._make_one(locale_dir)
+        for _ in range(2):
+            self.assertEqual(wrapper.translate('fr', 'Web site', 'test', {}),
+                             'Site web')
+            self.assertEqual(
+                wrapper.translate('fr', 'My name is ${name}.', 'test',
+                                  {'name': 'John'}),
+                'Mon nom est John.')
+            self.assertEqual(wrapper.translate('pt', 'Web site', 'test', {}),
+                             'Web site')
+        self.assertEqual(wrapper.pop_stats(), (3, 3))
+        self.assertEqual(wrapper.pop_stats(), (0, 0))
+        # Mappings are not part of the key.
+        self.assertEqual(
+            wrapper.translate('fr', 'My name is ${name}.', 'test',
+                              {'name': 'Jane'}),
+            'Mon nom est Jane.')
+        self.assertEqual(wrapper.pop_stats(), (1, 0))
+
+    def test_memo_size(self):
+        import os
+        here = os.path.dirname(__file__)
+        locale_dir = os.path.join(here, 'fixtures', 'site1', 'locale')
+        wrapper = self._make_one(locale_dir)
+        wrapper.memo_size = 2
+        wrapper.translate('fr', 'Web site', 'test', {})
+        wrapper.translate('fr', 'foo', 'test', {})
+        wrapper.translate('fr', 'Web site', 'test', {})
+        # Discard 'foo', which is the least recently used message.
+        wrapper.translate('fr', 'bar', 'test', {})
+        self.assertEqual(list(wrapper._memo),
+                         [('fr', 'test', 'Web site'), ('fr', 'test', 'bar')])
+        self.assertEqual(wrapper.pop_stats(), (1, 3))
+
+    def test_translation_string(self):
+        import os
+        from translationstring import TranslationString
+        here = os.path.dirname(__file__)
+        locale_dir = os.path.join(here, 'fixtures', 'site1', 'locale')
+        wrapper = self._make_one(locale_dir)
+        msgid = TranslationString('Unknown msgid', default='Default')
+        self.assertEqual(wrapper.translate('fr', msgid, 'test', {}),
+                         'Default')
+        self.assertEqual(wrapper.pop_stats(), (0, 0))
+
+    def test_catalogs_are_loaded_lazily(self):
+        import os
+        here = os.path.dirname(__file__)
+        locale_dir = os.path.join(here, 'fixtures', 'site1', 'locale')
+        wrapper = self._make_one(locale_dir)
+        self.assertEqual(wrapper.translators, {})
+        wrapper.translate('fr', 'Web site', 'test', {})
+        wrapper.translate('pt', 'Web site', 'test', {})
+        self.assertEqual(sorted(wrapper.translators), [('fr', 'test'),
+                                                       ('pt', 'test')])
+        self.assertIsNone(wrapper.translators[('pt', 'test')])
+        wrapper.close()
+        self.assertEqual(wrapper._catalogs, [])
+
+
+class TestMOCatalog(TestCase):
+
+    def _make_one(self, path):
+        from soho.i18n import MOCatalog
+        return MOCatalog(path)
+
+    def _write_mo(self, path, messages, byte_order='<'):
+        """Write a ``.mo`` file without hash table, like Python's
+        ``msgfmt.py`` does.
+        """
+        import struct
+        keys = sorted(messages)
+        ids = strs = b''
+        offsets = []
+        for key in keys:
+            offsets.append((len(ids), len(key), len(strs),
+                            len(messages[key])))
+            ids += key + b'\0'
+            strs += messages[key] + b'\0'
+        originals = 28
+        translations = originals + 8 * len(keys)
+        ids_start = translations + 8 * len(keys)
+        strs_start = ids_start + len(ids)
+        data = struct.pack(byte_order + '7I', 0x950412de, 0, len(keys),
+                           originals, translations, 0, 0)
+        for id_offset, id_length, _, _ in offsets:
+            data += struct.pack(byte_order + '2I', id_length,
+                                ids_start + id_offset)
+        for _, _, str_offset, str_length in offsets:
+            data += struct.pack(byte_order + '2I', str_length,
+                                strs_start + str_offset)
+        with open(path, 'wb') as fp:
+            fp.write(data + ids + strs)
+
+    def test_same_as_gnu_translations(self):
+        import os
+        from gettext import GNUTranslations
+        here = os.path.dirname(__file__)
+        for path in (
+                # with a hash table
+                os.path.join(here, 'fixtures', 'site1', 'locale', 'fr',
+                             'LC_MESSAGES', 'test.mo'),
+                # without hash table
+                os.path.join(here, '..', 'docs', '_tutorial', '4-i18n',
+                             'locale', 'fr', 'LC_MESSAGES', 'tutorial.mo')):
+            with open(path, 'rb') as fp:
+                expected = GNUTranslations(fp)
+            catalog = self._make_one(path)
+            msgids = [msgid for msgid in expected._catalog if msgid]
+            self.assertTrue(msgids)
+            for msgid in msgids + ['Unknown', 'Zzz', '']:
+                self.assertEqual(catalog.gettext(msgid),
+                                 expected.gettext(msgid))
+            catalog.close()
+
+    def test_byte_order_and_plural_forms(self):
+        import os
+        from tempfile import mkdtemp
+        import shutil
+        tmp_dir = mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'test.mo')
+            messages = {
+                b'': b'Content-Type: text/plain; charset=latin-1\n',
+                b'apple\0apples': b'pomme\0pommes',
+                b'caf\xe9': b'coffee',
+                b'tea': b'th\xe9'}
+            for byte_order in '<>':
+                self._write_mo(path, messages, byte_order)
+                catalog = self._make_one(path)
+                self.assertEqual(catalog.charset, 'latin-1')
+                self.assertEqual(catalog.gettext('tea'), 'th\xe9')
+                self.assertEqual(catalog.gettext('caf\xe9'), 'coffee')
+                self.assertEqual(catalog.gettext('apple'), 'apple')
+                self.assertEqual(catalog.gettext('\u20ac'), '\u20ac')
+                catalog.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_bad_magic_number(self):
+        import os
+        from tempfile import mkdtemp
+        import shutil
+        tmp_dir = mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'test.mo')
+            for data in (b'', b'not a catalog' * 4):
+                with open(path, 'wb') as fp:
+                    fp.write(data)
+                self.assertRaises(OSError, self._make_one, path)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+class TestInterpolation(TestCase):
+
+    def _make_one(self, text, *args):
+        from soho.i18n import Interpolation
+        return Interpolation(text, *args)
+
+    def test_basics(self):
+        interpolation = self._make_one('${foo} and ${bar}, not $foo.')
+        self.assertEqual(interpolation({'foo': 1}),
+                         '1 and ${bar}, not $foo.')
+        self.assertEqual(interpolation({}), '${foo} and ${bar}, not $foo.')
+        self.assertEqual(interpolation(None), '${foo} and ${bar}, not $foo.')
+
+    def test_translation_markers(self):
+        from soho.i18n import TRANSLATION_MARKER_REGEXP
+        interpolation = self._make_one('${foo}, $foo, $$foo and ${foo',
+                                       TRANSLATION_MARKER_REGEXP)
+        self.assertEqual(interpolation({'foo': 'x'}),
+                         'x, x, $$foo and ${foo')
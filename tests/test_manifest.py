@@ -0,0 +1,133 @@
+from unittest import TestCase
+
+from .test_builder import temp_folder
+
+
+class TestFileDigest(TestCase):
+
+    def _call_fut(self, path):
+        from soho.manifest import file_digest
+        return file_digest(path)
+
+    def test_basics(self):
+        import os
+        with temp_folder() as tmp_dir:
+            path = os.path.join(tmp_dir, 'foo')
+            with open(path, 'w') as fp:
+                fp.write('foo')
+            self.assertEqual(self._call_fut(path),
+                             '0beec7b5ea3f0fdbc95d0dd47f3c5bc275da8a33')
+
+    def test_file_does_not_exist(self):
+        self.assertEqual(self._call_fut('/does/not/exist'), None)
+
+
+class TestManifest(TestCase):
+
+    def _make_one(self, path):
+        from soho.manifest import Manifest
+        return Manifest(path)
+
+    def _write(self, path, content):
+        with open(path, 'w') as fp:
+            fp.write(content)
+
+    def test_is_outdated(self):
+        import os
+        with temp_folder() as tmp_dir:
+            dep = os.path.join(tmp_dir, 'dep')
+            self._write(dep, 'foo')
+            manifest_path = os.path.join(tmp_dir, 'manifest')
+            manifest = self._make_one(manifest_path)
+            self.assertTrue(manifest.is_outdated('out.html', [dep]))
+            manifest.record('out.html', 'src.html', [dep])
+            self.assertFalse(manifest.is_outdated('out.html', [dep]))
+            manifest.save()
+            # New dependency
+            manifest = self._make_one(manifest_path)
+            self.assertTrue(manifest.is_outdated('out.html', [dep, 'new']))
+            # Modified dependency
+            self._write(dep, 'bar')
+            manifest = self._make_one(manifest_path)
+            self.assertTrue(manifest.is_outdated('out.html', [dep]))
+
+    def test_digest_is_reused_if_file_is_unchanged(self):
+        import os
+        import mock
+        with temp_folder() as tmp_dir:
+            dep = os.path.join(tmp_dir, 'dep')
+            self._write(dep, 'foo')
+            manifest_path = os.path.join(tmp_dir, 'manifest')
+            manifest = self._make_one(manifest_path)
+            manifest.record('out.html', 'src.html', [dep])
+            manifest.save()
+            manifest = self._make_one(manifest_path)
+            with mock.patch('soho.manifest.file_digest') as mock_digest:
+                self.assertFalse(manifest.is_outdated('out.html', [dep]))
+            self.assertFalse(mock_digest.called)
+
+    def test_unreadable_manifest(self):
+        import os
+        with temp_folder() as tmp_dir:
+            manifest_path = os.path.join(tmp_dir, 'manifest')
+            self._write(manifest_path, 'not JSON')
+            manifest = self._make_one(manifest_path)
+            self.assertEqual(manifest.outputs, {})
+
+    def test_manifest_of_another_version(self):
+        import json
+        import os
+        from soho.manifest import MANIFEST_VERSION
+        with temp_folder() as tmp_dir:
+            manifest_path = os.path.join(tmp_dir, 'manifest')
+            self._write(manifest_path, json.dumps(
+                {'version': 1, 'outputs': {'out.html': {}}}))
+            manifest = self._make_one(manifest_path)
+            self.assertEqual(manifest.outputs, {})
+            # Missing keys do not make the build crash either.
+            self._write(manifest_path, json.dumps(
+                {'version': MANIFEST_VERSION, 'outputs': {'out.html': {}}}))
+            manifest = self._make_one(manifest_path)
+            self.assertEqual(manifest.outputs, {})
+
+    def test_digest_in_several_threads(self):
+        import os
+        from concurrent.futures import ThreadPoolExecutor
+        from soho.manifest import file_digest
+        with temp_folder() as tmp_dir:
+            paths = []
+            for i in range(50):
+                path = os.path.join(tmp_dir, 'dep%d' % i)
+                self._write(path, 'content %d' % i)
+                paths.append(path)
+            manifest = self._make_one(os.path.join(tmp_dir, 'manifest'))
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                digests = list(executor.map(manifest.digest, paths))
+            self.assertEqual(digests, [file_digest(path) for path in paths])
+            self.assertEqual(sorted(manifest.pop_updates()['digests']),
+                             sorted(paths))
+
+    def test_paths_are_relative_on_disk(self):
+        import json
+        import os
+        with temp_folder() as tmp_dir:
+            dep = os.path.join(tmp_dir, 'src', 'dep')
+            os.mkdir(os.path.dirname(dep))
+            self._write(dep, 'foo')
+            manifest_path = os.path.join(tmp_dir, 'out', 'manifest')
+            os.mkdir(os.path.dirname(manifest_path))
+            manifest = self._make_one(manifest_path)
+            manifest.record('out.html', dep, [dep])
+            manifest.save()
+            with open(manifest_path) as fp:
+                data = json.load(fp)
+            relative = os.path.join('..', 'src', 'dep')
+            self.assertEqual(data['outputs']['out.html']['source'], relative)
+            self.assertEqual(list(data['outputs']['out.html']['deps']),
+                             [relative])
+            self.assertEqual(list(data['digests']), [relative])
+            self.assertNotIn(tmp_dir, json.dumps(data))
+            # Paths are absolute again once loaded.
+            manifest = self._make_one(manifest_path)
+            self.assertEqual(manifest.get_dependents(dep), set([dep]))
+            self.assertFalse(manifest.is_outdated('out.html', [dep]))
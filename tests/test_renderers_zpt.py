@@ -18,3 +18,68 @@ class TestZPTRenderer(TestCase):
                          '\n'.join(('<p>This is a paragraph.</p>',
                                     '<p>Dynamic value.</p>',
                                     '<p>I am translated.</p>')))
+
+    def test_cache(self):
+        import os
+        import shutil
+        from tempfile import mkdtemp
+        import mock
+        here = os.path.dirname(__file__)
+        tmp_dir = mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        filename = os.path.join(tmp_dir, 'test.pt')
+        shutil.copy(os.path.join(here, 'fixtures', 'test.pt'), filename)
+        cache_dir = os.path.join(tmp_dir, 'cache')
+        translate = lambda msgid, **kwargs: msgid
+        def get_modules():
+            return sorted(name for name in os.listdir(
+                os.path.join(cache_dir, 'templates')) if name.endswith('.py'))
+        def render():
+            renderer = self._make_one(filename, translate)
+            renderer.setup(cache_dir=cache_dir)
+            return renderer.render(foo='foo')
+        render()
+        modules = get_modules()
+        self.assertEqual(len(modules), 1)
+        # Another renderer (as in the next run) does not compile the
+        # template again.
+        with mock.patch('chameleon.template.BaseTemplate._compile') \
+                as mock_compile:
+            render()
+        self.assertFalse(mock_compile.called)
+        # A modified template is compiled again.
+        with open(filename, 'a') as fp:
+            fp.write('<p>Appended.</p>\n')
+        self.assertIn('Appended.', render())
+        self.assertEqual(len(get_modules()), 2)
+
+
+class TestFindLoadedTemplates(TestCase):
+
+    def _call_fut(self, path):
+        from soho.renderers.zpt import find_loaded_templates
+        return find_loaded_templates(path)
+
+    def test_basics(self):
+        import os
+        import shutil
+        from tempfile import mkdtemp
+        tmp_dir = mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        os.mkdir(os.path.join(tmp_dir, 'macros'))
+        for path, content in (
+                ('page.pt', '<p metal:use-macro="load: macros/main.pt"/>'
+                            '<p tal:define="m load:${name}.pt"/>'),
+                # 'footer.pt' is looked up in 'macros', then in the
+                # directory of 'page.pt'.
+                (os.path.join('macros', 'main.pt'),
+                 '<p metal:use-macro="load: footer.pt"/>'
+                 '<p metal:use-macro="load: page.pt"/>'),
+                ('footer.pt', '<p tal:define="x load: missing.pt"/>')):
+            with open(os.path.join(tmp_dir, path), 'w') as fp:
+                fp.write(content)
+        self.assertEqual(
+            self._call_fut(os.path.join(tmp_dir, 'page.pt')),
+            [os.path.join(tmp_dir, 'macros', 'main.pt'),
+             os.path.join(tmp_dir, 'footer.pt'),
+             os.path.join(tmp_dir, 'missing.pt')])
@@ -0,0 +1,82 @@
+from unittest import TestCase
+
+from .test_builder import DummyLogger
+from .test_builder import temp_folder
+
+
+class TestFindSources(TestCase):
+
+    def setUp(self):
+        import os
+        from soho.builder import Builder
+        from soho.cli import get_settings
+        from .base import make_options
+        here = os.path.dirname(__file__)
+        self.site_dir = os.path.join(here, 'fixtures', 'site1')
+        config_file = os.path.join(self.site_dir, 'sohoconf.py')
+        settings = get_settings(make_options(config_file=config_file,
+                                             do_nothing=True))
+        settings['logger'] = DummyLogger()
+        self.builder = Builder(**settings)
+
+    def _call_fut(self, url_path):
+        import os
+        sources = self.builder.find_sources(url_path)
+        return [os.path.relpath(path, self.site_dir) for path in sources]
+
+    def test_generated_file(self):
+        self.assertEqual(self._call_fut('/second.html'), ['src/second.rst'])
+        self.assertEqual(self._call_fut('/sub/jack.html'),
+                         ['src/sub/jack.html'])
+
+    def test_hidden_index_html(self):
+        self.assertEqual(self._call_fut('/'), ['src/index.html'])
+        self.assertEqual(self._call_fut('/index.html'), ['src/index.html'])
+
+    def test_copied_file(self):
+        self.assertEqual(self._call_fut('/keepme.txt'), ['src/keepme.txt'])
+
+    def test_asset(self):
+        self.assertEqual(self._call_fut('/robots.txt'), ['assets/robots.txt'])
+
+    def test_unknown_or_ignored_file(self):
+        self.assertEqual(self._call_fut('/unknown.html'), [])
+        self.assertEqual(self._call_fut('/ignored.txt'), [])
+        self.assertEqual(self._call_fut('/sub/.meta.py'), [])
+
+    def test_outside_of_site(self):
+        self.assertEqual(self._call_fut('/../sohoconf.py'), [])
+
+
+class TestServer(TestCase):
+
+    def test_file_is_generated_on_request(self):
+        import os
+        import threading
+        from urllib.request import urlopen
+        from soho.builder import Builder
+        from soho.cli import get_settings
+        from soho.server import make_server
+        from .base import make_options
+        here = os.path.dirname(__file__)
+        site_dir = os.path.join(here, '..', 'docs', '_tutorial', '3-metadata')
+        config_file = os.path.join(site_dir, 'sohoconf.py')
+        settings = get_settings(make_options(config_file=config_file))
+        with temp_folder() as out_dir:
+            settings.update(logger=DummyLogger(), out_dir=out_dir)
+            builder = Builder(**settings)
+            server = make_server(builder, out_dir, 'localhost', 0)
+            thread = threading.Thread(target=server.serve_forever)
+            thread.start()
+            try:
+                url = 'http://localhost:%d/second.html' % server.server_port
+                response = urlopen(url)
+                body = response.read().decode('utf-8')
+                response.close()
+            finally:
+                server.shutdown()
+                server.server_close()
+                thread.join()
+            self.assertIn('You have reached the second page', body)
+            self.assertEqual(sorted(os.listdir(out_dir)),
+                             ['.soho-manifest.json', 'second.html'])
@@ -12,10 +12,9 @@ class TestRegisterPlugin(TestCase):
         return register_plugin(registry, spec, *keys)
 
     def test_basics(self):
-        from soho.renderers.zpt import ZPTRenderer
         registry = {}
         self._call_fut(registry, 'soho.renderers.zpt.ZPTRenderer', 'zpt')
-        self.assertEqual(registry, {'zpt': ZPTRenderer})
+        self.assertEqual(registry, {'zpt': 'soho.renderers.zpt.ZPTRenderer'})
 
     def test_no_keys(self):
         registry = {}
@@ -24,20 +23,52 @@ class TestRegisterPlugin(TestCase):
                           registry, 'soho.renderers.zpt.ZPTRenderer')
 
     def test_multiple_keys(self):
-        from soho.renderers.zpt import ZPTRenderer
         registry = {}
         self._call_fut(registry, 'soho.renderers.zpt.ZPTRenderer', 'zpt', 'pt')
+        self.assertEqual(registry, {'zpt': 'soho.renderers.zpt.ZPTRenderer',
+                                    'pt': 'soho.renderers.zpt.ZPTRenderer'})
+
+
+class TestGetPlugin(TestCase):
+
+    def _call_fut(self, registry, key):
+        from soho.utils import get_plugin
+        return get_plugin(registry, key)
+
+    def test_basics(self):
+        from soho.renderers.zpt import ZPTRenderer
+        registry = {'zpt': 'soho.renderers.zpt.ZPTRenderer',
+                    'pt': 'soho.renderers.zpt.ZPTRenderer',
+                    'foo': 'unittest.TestCase'}
+        self.assertIs(self._call_fut(registry, 'zpt'), ZPTRenderer)
         self.assertEqual(registry, {'zpt': ZPTRenderer,
-                                    'pt': ZPTRenderer})
+                                    'pt': ZPTRenderer,
+                                    'foo': 'unittest.TestCase'})
+        self.assertIs(self._call_fut(registry, 'pt'), ZPTRenderer)
+
+    def test_unknown_key(self):
+        self.assertIsNone(self._call_fut({}, 'foo'))
 
     @mock.patch('logging.debug')
     def test_import_error_is_logged(self, mock_debug):
-        registry = {}
-        self._call_fut(registry, 'does.not.exist', 'foo')
+        registry = {'foo': 'does.not.exist', 'bar': 'does.not.exist'}
+        self.assertIsNone(self._call_fut(registry, 'foo'))
         self.assertEqual(registry, {})
         error = 'Could not import plugin: "%s".'
         mock_debug.assert_called_with(error, 'does.not.exist')
 
+    def test_plugins_are_not_imported_on_startup(self):
+        import os
+        import subprocess
+        import sys
+        code = ('import sys; import soho.cli; '
+                'print(sorted(m for m in sys.modules '
+                'if m.split(".")[0] in ("chameleon", "docutils", "sphinx")))')
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         cwd=root)
+        self.assertEqual(output.strip(), b'[]')
+
 
 class TestReadFileMetadata(TestCase):
     def _call_fut(self, path):
@@ -126,3 +157,393 @@ class TestSitemap(TestCase):
             '  </url>',
             '</urlset>']
         self.assertEqual(out.getvalue().split('\n'), expected)
+
+
+class TestMetadata(TestCase):
+
+    def _make_one(self, layer=None):
+        from soho.utils import Metadata
+        return Metadata(layer)
+
+    def test_inheritance(self):
+        parent = self._make_one({'foo': 'parent foo', 'bar': 'parent bar'})
+        child = parent.child({'foo': 'child foo'})
+        self.assertEqual(child['foo'], 'child foo')
+        self.assertEqual(child['bar'], 'parent bar')
+        self.assertEqual(child.get('baz'), None)
+        self.assertRaises(KeyError, lambda: child['baz'])
+        self.assertIn('bar', child)
+        self.assertNotIn('baz', child)
+        self.assertEqual(dict(child), {'foo': 'child foo',
+                                       'bar': 'parent bar'})
+        self.assertEqual(len(child), 2)
+
+    def test_copy_on_write(self):
+        parent = self._make_one({'foo': 'parent foo'})
+        child = parent.child()
+        child['foo'] = 'child foo'
+        child['bar'] = 'child bar'
+        self.assertEqual(dict(child), {'foo': 'child foo',
+                                       'bar': 'child bar'})
+        self.assertEqual(dict(parent), {'foo': 'parent foo'})
+
+    def test_empty(self):
+        metadata = self._make_one()
+        self.assertEqual(dict(metadata), {})
+        self.assertEqual(len(metadata), 0)
+
+
+class TestCodeCache(TestCase):
+
+    def _make_one(self, cache_dir=None):
+        from soho.utils import CodeCache
+        return CodeCache(cache_dir)
+
+    def _write(self, path, content):
+        with open(path, 'w') as fp:
+            fp.write(content)
+
+    def test_code_is_compiled_once(self):
+        import os
+        from .test_builder import temp_folder
+        with temp_folder() as tmp_dir:
+            path = os.path.join(tmp_dir, 'foo.meta.py')
+            self._write(path, 'foo = 1')
+            cache = self._make_one()
+            code = cache.get_code(path)
+            self.assertIs(cache.get_code(path), code)
+            # Modified file
+            self._write(path, 'foo = 12')
+            self.assertIsNot(cache.get_code(path), code)
+
+    def test_code_is_cached_on_disk(self):
+        import os
+        from .test_builder import temp_folder
+        with temp_folder() as tmp_dir:
+            path = os.path.join(tmp_dir, 'foo.meta.py')
+            self._write(path, 'foo = 1')
+            cache_dir = os.path.join(tmp_dir, 'cache')
+            code = self._make_one(cache_dir).get_code(path)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            with mock.patch('soho.utils.compile', create=True) as mock_compile:
+                cached = self._make_one(cache_dir).get_code(path)
+            self.assertFalse(mock_compile.called)
+            self.assertEqual(cached, code)
+
+    def test_file_does_not_exist(self):
+        cache = self._make_one()
+        self.assertRaises(OSError, cache.get_code, '/does/not/exist')
+
+
+class TestFragmentCache(TestCase):
+
+    def _make_one(self, cache_dir=None):
+        from soho.utils import FragmentCache
+        return FragmentCache(cache_dir)
+
+    def test_basics(self):
+        import os
+        from .test_builder import temp_folder
+        with temp_folder() as tmp_dir:
+            cache_dir = os.path.join(tmp_dir, 'cache')
+            cache = self._make_one(cache_dir)
+            key = cache.make_key('1.0', 'source')
+            self.assertNotEqual(key, cache.make_key('1.1', 'source'))
+            self.assertIsNone(cache.get(key))
+            cache.set(key, {'body': '<p>Foo</p>'})
+            self.assertEqual(os.listdir(cache_dir), [key])
+            cache = self._make_one(cache_dir)
+            self.assertEqual(cache.get(key), {'body': '<p>Foo</p>'})
+
+    def test_no_cache_dir(self):
+        cache = self._make_one()
+        key = cache.make_key('source')
+        cache.set(key, {'body': '<p>Foo</p>'})
+        self.assertIsNone(cache.get(key))
+
+
+class TestReadFrontMatter(TestCase):
+
+    def _call_fut(self, text):
+        from soho.utils import read_front_matter
+        return read_front_matter(text)
+
+    def test_no_front_matter(self):
+        self.assertEqual(self._call_fut('<p>foo</p>'), ({}, '<p>foo</p>'))
+        self.assertEqual(self._call_fut('foo\n---\nbar: baz\n---\n'),
+                         ({}, 'foo\n---\nbar: baz\n---\n'))
+
+    def test_simple_front_matter(self):
+        text = '---\nfoo: Value: of foo\n# comment\n\nbar:\n---\nbody\n'
+        self.assertEqual(self._call_fut(text),
+                         ({'foo': 'Value: of foo', 'bar': ''}, 'body\n'))
+
+    def test_empty_front_matter(self):
+        self.assertEqual(self._call_fut('---\n---\nbody'), ({}, 'body'))
+
+    def test_not_simple_front_matter(self):
+        # A reStructuredText title with an overline.
+        text = '---\nFoo\n---\n\nBody'
+        self.assertEqual(self._call_fut(text), ({}, text))
+
+    def test_toml_front_matter(self):
+        from soho.utils import _get_toml_parser
+        if _get_toml_parser() is None:  # pragma: no cover
+            return
+        text = '+++\nfoo = "bar"\nbaz = [1, 2]\n+++\nbody'
+        self.assertEqual(self._call_fut(text),
+                         ({'foo': 'bar', 'baz': [1, 2]}, 'body'))
+
+
+class TestSitemapSplitting(TestCase):
+
+    def _make_one(self, **kwargs):
+        from soho.utils import Sitemap
+        return Sitemap(**kwargs)
+
+    def _add_urls(self, sitemap, *names):
+        for name in names:
+            sitemap.add(name, 'http://exemple.com/' + name, 'monthly', 0.5,
+                        mtime=1234567890)
+
+    def test_entries_are_sorted_when_spilled_on_disk(self):
+        sitemap = self._make_one(buffer_size=2)
+        self._add_urls(sitemap, 'c', 'a', 'e', 'b', 'd')
+        self.assertEqual(len(sitemap._runs), 2)
+        urls = [entry[0] for entry in sitemap.entries()]
+        self.assertEqual(urls, ['http://exemple.com/' + name
+                                for name in 'abcde'])
+        self.assertEqual(len(sitemap.pop_entries()), 5)
+        self.assertEqual(list(sitemap.entries()), [])
+
+    def test_save_single_file(self):
+        import os
+        from .test_builder import temp_folder
+        sitemap = self._make_one(max_urls=2)
+        self._add_urls(sitemap, 'b', 'a&b')
+        with temp_folder() as tmp_dir:
+            path = os.path.join(tmp_dir, 'sitemap.xml')
+            self.assertEqual(sitemap.save(path, 'http://exemple.com'), [path])
+            with open(path) as fp:
+                content = fp.read()
+        self.assertIn('<urlset', content)
+        self.assertIn('<loc>http://exemple.com/a&amp;b</loc>', content)
+
+    def test_save_several_files(self):
+        import os
+        from .test_builder import temp_folder
+        sitemap = self._make_one(max_urls=2)
+        self._add_urls(sitemap, 'a', 'b', 'c')
+        with temp_folder() as tmp_dir:
+            path = os.path.join(tmp_dir, 'sitemap.xml')
+            written = sitemap.save(path, 'http://exemple.com/')
+            self.assertEqual([os.path.basename(p) for p in written],
+                             ['sitemap.xml', 'sitemap-1.xml', 'sitemap-2.xml'])
+            with open(path) as fp:
+                index = fp.read()
+            with open(written[2]) as fp:
+                last = fp.read()
+        self.assertIn('<sitemapindex', index)
+        self.assertIn('<loc>http://exemple.com/sitemap-1.xml</loc>', index)
+        self.assertIn('<loc>http://exemple.com/sitemap-2.xml</loc>', index)
+        self.assertIn('<loc>http://exemple.com/c</loc>', last)
+        self.assertNotIn('<loc>http://exemple.com/b</loc>', last)
+
+    def test_save_compressed(self):
+        import gzip
+        import os
+        from .test_builder import temp_folder
+        sitemap = self._make_one()
+        self._add_urls(sitemap, 'a')
+        with temp_folder() as tmp_dir:
+            path = os.path.join(tmp_dir, 'sitemap.xml')
+            written = sitemap.save(path, 'http://exemple.com', compress=True)
+            self.assertEqual(written, [path + '.gz'])
+            with gzip.open(path + '.gz', 'rt') as fp:
+                self.assertIn('<loc>http://exemple.com/a</loc>', fp.read())
+
+
+class TestSitemapStore(TestCase):
+
+    def _make_one(self, data, max_urls=2):
+        from soho.utils import SitemapStore
+        return SitemapStore(data, max_urls=max_urls)
+
+    def _save(self, store, tmp_dir, force=False):
+        import os
+        path = os.path.join(tmp_dir, 'sitemap.xml')
+        written = store.save(path, 'http://exemple.com', force=force)
+        return [os.path.basename(p) for p in written]
+
+    def test_only_modified_files_are_written(self):
+        from .test_builder import temp_folder
+        data = {}
+        store = self._make_one(data)
+        with temp_folder() as tmp_dir:
+            for url in ('a', 'b', 'c'):
+                store.set(url, '2012-01-01', 'monthly', 0.5)
+            self.assertEqual(self._save(store, tmp_dir),
+                             ['sitemap.xml', 'sitemap-1.xml', 'sitemap-2.xml'])
+            # Nothing has changed
+            store = self._make_one(data)
+            store.set('c', '2012-01-01', 'monthly', 0.5)
+            self.assertFalse(store.dirty)
+            self.assertEqual(self._save(store, tmp_dir), [])
+            # Modified entry
+            store.set('c', '2012-01-02', 'monthly', 0.5)
+            self.assertEqual(self._save(store, tmp_dir), ['sitemap-2.xml'])
+            # Removed entry, then added entry that takes its place
+            store.remove('a')
+            store.set('d', '2012-01-01', 'monthly', 0.5)
+            self.assertEqual(self._save(store, tmp_dir), ['sitemap-1.xml'])
+            self.assertEqual(store.urls(), set(('b', 'c', 'd')))
+            # New entry in a file that is not full
+            store.set('e', '2012-01-01', 'monthly', 0.5)
+            self.assertEqual(self._save(store, tmp_dir), ['sitemap-2.xml'])
+            # New file
+            store.set('f', '2012-01-01', 'monthly', 0.5)
+            self.assertEqual(self._save(store, tmp_dir),
+                             ['sitemap.xml', 'sitemap-3.xml'])
+            # Forced
+            self.assertEqual(self._save(store, tmp_dir, force=True),
+                             ['sitemap.xml', 'sitemap-1.xml', 'sitemap-2.xml',
+                              'sitemap-3.xml'])
+
+    def test_single_file(self):
+        import os
+        from .test_builder import temp_folder
+        store = self._make_one({})
+        with temp_folder() as tmp_dir:
+            store.set('b', '2012-01-01', 'monthly', 0.5)
+            store.set('a', '2012-01-01', 'monthly', 0.5)
+            self.assertEqual(self._save(store, tmp_dir), ['sitemap.xml'])
+            with open(os.path.join(tmp_dir, 'sitemap.xml')) as fp:
+                content = fp.read()
+            self.assertIn('<urlset', content)
+            self.assertLess(content.index('<loc>a</loc>'),
+                            content.index('<loc>b</loc>'))
+            self.assertEqual(self._save(store, tmp_dir), [])
+            # Missing file is written again.
+            os.unlink(os.path.join(tmp_dir, 'sitemap.xml'))
+            self.assertEqual(self._save(store, tmp_dir), ['sitemap.xml'])
+
+    def test_emptied_files_are_removed(self):
+        import os
+        from .test_builder import temp_folder
+        store = self._make_one({})
+        with temp_folder() as tmp_dir:
+            for url in ('a', 'b', 'c', 'd', 'e'):
+                store.set(url, '2012-01-01', 'monthly', 0.5)
+            self._save(store, tmp_dir)
+            store.remove('c')
+            store.remove('d')
+            self.assertEqual(self._save(store, tmp_dir), ['sitemap.xml'])
+            self.assertEqual(sorted(os.listdir(tmp_dir)),
+                             ['sitemap-1.xml', 'sitemap-3.xml', 'sitemap.xml'])
+            with open(os.path.join(tmp_dir, 'sitemap.xml')) as fp:
+                self.assertNotIn('sitemap-2.xml', fp.read())
+            # Back to a single file.
+            store.remove('e')
+            self.assertEqual(self._save(store, tmp_dir), ['sitemap.xml'])
+            self.assertEqual(os.listdir(tmp_dir), ['sitemap.xml'])
+            with open(os.path.join(tmp_dir, 'sitemap.xml')) as fp:
+                self.assertIn('<urlset', fp.read())
+
+    def test_compress_is_toggled(self):
+        import os
+        from .test_builder import temp_folder
+        store = self._make_one({})
+        with temp_folder() as tmp_dir:
+            path = os.path.join(tmp_dir, 'sitemap.xml')
+            for url in ('a', 'b', 'c'):
+                store.set(url, '2012-01-01', 'monthly', 0.5)
+            store.save(path, 'http://exemple.com')
+            written = store.save(path, 'http://exemple.com', compress=True)
+            self.assertEqual(sorted(os.path.basename(p) for p in written),
+                             ['sitemap-1.xml.gz', 'sitemap-2.xml.gz',
+                              'sitemap.xml.gz'])
+            self.assertEqual(sorted(os.listdir(tmp_dir)),
+                             ['sitemap-1.xml.gz', 'sitemap-2.xml.gz',
+                              'sitemap.xml.gz'])
+
+
+class TestSyncFile(TestCase):
+
+    def _call_fut(self, src, dst, mode):
+        from soho.utils import sync_file
+        return sync_file(src, dst, mode)
+
+    def _check(self, mode, expected_shared=None):
+        import os
+        from .test_builder import temp_folder
+        with temp_folder() as tmp_dir:
+            src = os.path.join(tmp_dir, 'src')
+            dst = os.path.join(tmp_dir, 'dst')
+            with open(src, 'w') as fp:
+                fp.write('foo')
+            os.utime(src, (1000000000, 1000000000))
+            # A copy (or link) of another file is replaced.
+            with open(dst, 'w') as fp:
+                fp.write('bar')
+            shared = self._call_fut(src, dst, mode)
+            if expected_shared is not None:
+                self.assertEqual(shared, expected_shared)
+            with open(dst) as fp:
+                self.assertEqual(fp.read(), 'foo')
+            self.assertEqual(os.stat(dst).st_mtime, 1000000000)
+            self.assertEqual(os.path.samefile(src, dst), mode == 'hardlink')
+            # It also works if the destination is a link to the source.
+            self._call_fut(src, dst, 'hardlink')
+            self._call_fut(src, dst, mode)
+            with open(dst) as fp:
+                self.assertEqual(fp.read(), 'foo')
+
+    def test_copy(self):
+        self._check('copy', expected_shared=False)
+
+    def test_hardlink(self):
+        self._check('hardlink', expected_shared=True)
+
+    def test_reflink(self):
+        # Whether data is shared depends on the file system.
+        self._check('reflink')
+
+
+class TestCombineRegexps(TestCase):
+
+    def _call_fut(self, *patterns, **kwargs):
+        import re
+        from soho.utils import combine_regexps
+        flags = kwargs.get('flags', ())
+        regexps = [re.compile(pattern, flags[i] if flags else 0)
+                   for i, pattern in enumerate(patterns)]
+        return combine_regexps(regexps)
+
+    def test_no_regexp(self):
+        regexp = self._call_fut()
+        self.assertIsNone(regexp.match(''))
+        self.assertIsNone(regexp.match('foo'))
+
+    def test_basics(self):
+        regexp = self._call_fut('.*~$', 'foo|bar', 'baz$')
+        self.assertTrue(regexp.match('file~'))
+        self.assertTrue(regexp.match('bar/qux'))
+        self.assertTrue(regexp.match('baz'))
+        self.assertIsNone(regexp.match('qux/baz/qux'))
+        # Expressions are anchored at the beginning, like 'match()'.
+        self.assertIsNone(regexp.match('qux/foo'))
+
+    def test_different_flags(self):
+        import re
+        regexp = self._call_fut('foo', 'bar', flags=(0, re.IGNORECASE))
+        self.assertTrue(regexp.match('BAR'))
+        self.assertIsNone(regexp.match('FOO'))
+        self.assertTrue(regexp.match('foo'))
+
+    def test_backreference(self):
+        # '\1' refers to the group of the second expression, not to the
+        # group of the first one.
+        regexp = self._call_fut('(a)b', r'(x)y\1')
+        self.assertTrue(regexp.match('ab'))
+        self.assertTrue(regexp.match('xyx'))
+        self.assertIsNone(regexp.match('xya'))
@@ -0,0 +1,93 @@
+from unittest import TestCase
+
+from .test_builder import temp_folder
+
+
+class TestGetChanges(TestCase):
+
+    def _call_fut(self, old, new):
+        from soho.watch import get_changes
+        return get_changes(old, new)
+
+    def test_basics(self):
+        old = {'removed': (1, 1), 'modified': (1, 1), 'same': (1, 1)}
+        new = {'added': (1, 1), 'modified': (2, 1), 'same': (1, 1)}
+        self.assertEqual(self._call_fut(old, new),
+                         ['added', 'modified', 'removed'])
+
+    def test_no_changes(self):
+        self.assertEqual(self._call_fut({'foo': (1, 1)}, {'foo': (1, 1)}),
+                         [])
+
+
+class DummyBuilder(object):
+    def __init__(self):
+        from .test_builder import DummyLogger
+        self.logger = DummyLogger()
+        self.rebuilt = []
+    def rebuild(self, paths):
+        self.rebuilt.append(paths)
+
+
+class TestWatcher(TestCase):
+
+    def _make_one(self, builder, dirs):
+        from soho.watch import Watcher
+        return Watcher(builder, dirs)
+
+    def _test_check(self):
+        import os
+        builder = DummyBuilder()
+        with temp_folder() as tmp_dir:
+            path = os.path.join(tmp_dir, 'foo')
+            with open(path, 'w') as fp:
+                fp.write('foo')
+            watcher = self._make_one(builder, [tmp_dir, None])
+            self.assertEqual(watcher.check(), [])
+            self.assertEqual(builder.rebuilt, [])
+            with open(path, 'w') as fp:
+                fp.write('modified')
+            self.assertEqual(watcher.check(), [path])
+            self.assertEqual(builder.rebuilt, [[path]])
+            # New directory and its files.
+            os.mkdir(os.path.join(tmp_dir, 'new'))
+            new_path = os.path.join(tmp_dir, 'new', 'bar')
+            with open(new_path, 'w') as fp:
+                fp.write('bar')
+            self.assertEqual(watcher.check(), [new_path])
+            with open(new_path, 'w') as fp:
+                fp.write('modified')
+            self.assertEqual(watcher.check(), [new_path])
+            # Removed file.
+            os.unlink(path)
+            self.assertEqual(watcher.check(), [path])
+            self.assertEqual(watcher.check(), [])
+
+    def test_check_polling(self):
+        import mock
+        with mock.patch('soho.watch.INotify', None):
+            self._test_check()
+
+    def test_check_inotify(self):
+        from soho.watch import INotify
+        if INotify is None:  # pragma: no cover
+            self.skipTest('"inotify_simple" is not installed.')
+        self._test_check()
+
+    def test_inotify_does_not_walk(self):
+        import os
+        import mock
+        from soho.watch import INotify
+        if INotify is None:  # pragma: no cover
+            self.skipTest('"inotify_simple" is not installed.')
+        builder = DummyBuilder()
+        with temp_folder() as tmp_dir:
+            watcher = self._make_one(builder, [tmp_dir])
+            path = os.path.join(tmp_dir, 'foo')
+            with open(path, 'w') as fp:
+                fp.write('foo')
+            with mock.patch('os.walk') as mock_walk:
+                with mock.patch('os.stat') as mock_stat:
+                    self.assertEqual(watcher.check(), [path])
+            self.assertFalse(mock_walk.called)
+            self.assertFalse(mock_stat.called)